@@ -0,0 +1,70 @@
+"""
+JSON helpers shared by the agent and the LLM providers.
+
+``orjson`` is used when installed (``pip install agentexp[speedups]``), as it
+is several times faster than the standard library and encodes straight to
+bytes; otherwise the standard ``json`` module is used.
+"""
+
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_DECODER = json.JSONDecoder()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object to UTF-8 encoded JSON.
+
+    Args:
+        obj: The object to serialize
+
+    Returns:
+        The JSON document as bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def loads(data: Any) -> Any:
+    """
+    Deserialize a JSON document.
+
+    Args:
+        data: The JSON document, as str or bytes
+
+    Returns:
+        The decoded object
+
+    Raises:
+        json.JSONDecodeError: If the document is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def find_json_object(text: str) -> Optional[tuple[Any, int]]:
+    """
+    Decode the first complete JSON object embedded in a text.
+
+    Args:
+        text: Text possibly containing a JSON object among other content
+
+    Returns:
+        The decoded object and the index just past its end in ``text``,
+        or None if the text contains no complete JSON object
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            return _DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            start = text.find("{", start + 1)
+    return None
@@ -5,13 +5,152 @@ The Agent is the main class that orchestrates tool use and LLM interaction
 to accomplish tasks.
 """
 
+import ast
+import asyncio
 import json
 import re
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Callable, Optional, Union
 
+from agentexp._json import dumps, find_json_object, loads
+from agentexp.calculator_tools import _CALCULATOR
 from agentexp.llm import LLMProvider
 from agentexp.tools import Tool
 
+# Tasks that are a bare arithmetic expression, e.g. "What is 15*23+47?"
+_ARITHMETIC_TASK = re.compile(
+    r"^\s*(?:what is |calculate |compute )?([-+0-9.()\s*/^%]+)\??\s*$",
+    re.IGNORECASE,
+)
+
+# Largest exponent the fast path evaluates: bigger powers can take arbitrarily
+# long to compute, so those tasks are left to the LLM
+_MAX_FAST_PATH_EXPONENT = 1000
+
+# Upper bound on the threads running a batch of tool calls, whatever the
+# number of calls the model requested
+_MAX_TOOL_WORKERS = 8
+
+# orjson only encodes integers that fit in 64 bits
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+
+# Marks the message that replaces steps dropped from the history
+_SUMMARY_PREFIX = "[Summary of previous steps]:"
+
+_SYSTEM_PROMPT_TEMPLATE = """You are a helpful AI assistant that can use tools to \
+accomplish tasks.
+
+Available tools:
+{tools_desc}
+
+To use a tool, respond with a JSON object in this format:
+{{"tool": "tool_name", "arguments": {{"arg1": "value1", "arg2": "value2"}}}}
+
+To use several independent tools at once, respond with a list of tool calls:
+{{"tools": [{{"tool": "tool_name", "arguments": {{"arg1": "value1"}}}}, \
+{{"tool": "other_tool", "arguments": {{"arg1": "value1"}}}}]}}
+The results then come back in a single message, as a JSON array of \
+{{"name": "tool_name", "result": ...}} objects in the same order as the calls.
+
+When you have completed the task, respond with:
+{{"final_answer": "your answer here"}}
+
+Always think step by step and use tools to verify your work when possible.
+"""
+
+
+class _RateLimiter:
+    """
+    Space out requests to stay under a requests-per-minute limit.
+
+    Each call to :meth:`acquire` reserves the next free slot, so concurrent
+    callers are released one interval apart.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+                now = self._next_slot
+            self._next_slot = now + self.interval
+
+
+def _has_bounded_powers(expression: str) -> bool:
+    """
+    Check that evaluating an expression cannot blow up through exponentiation.
+
+    Every power must raise an operand without powers of its own to a constant
+    exponent of at most ``_MAX_FAST_PATH_EXPONENT``, which rules out
+    expressions such as ``9**9**9``.
+
+    Args:
+        expression: The arithmetic expression
+
+    Returns:
+        True if all powers in the expression are bounded
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow)):
+            continue
+        exponent = node.right
+        if isinstance(exponent, ast.UnaryOp) and isinstance(
+            exponent.op, (ast.USub, ast.UAdd)
+        ):
+            exponent = exponent.operand
+        if not (
+            isinstance(exponent, ast.Constant)
+            and abs(exponent.value) <= _MAX_FAST_PATH_EXPONENT
+        ):
+            return False
+        if any(
+            isinstance(inner, ast.BinOp) and isinstance(inner.op, ast.Pow)
+            for inner in ast.walk(node.left)
+        ):
+            return False
+    return True
+
+
+def _json_safe(value: Any) -> Any:
+    """
+    Convert a tool result into a value that any JSON backend can encode.
+
+    Containers are converted recursively. Integers beyond 64 bits become
+    strings, in scientific notation when they are too long for ``str()``,
+    and other unsupported objects are converted with ``str()``.
+
+    Args:
+        value: The tool result
+
+    Returns:
+        The JSON-safe value
+    """
+    if value is None or isinstance(value, (bool, float, str)):
+        return value
+    if isinstance(value, int):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            return value
+        try:
+            return str(value)
+        except ValueError:
+            return f"{Decimal(value):.6e}"
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    return str(value)
+
 
 class Agent:
     """
@@ -31,6 +170,9 @@ class Agent:
         llm_provider: LLMProvider,
         tools: list[Tool],
         max_iterations: int = 10,
+        history_window: Optional[int] = 4,
+        summarize: bool = False,
+        early_exit_json: bool = False,
     ):
         """
         Initialize the agent.
@@ -39,43 +181,113 @@ class Agent:
             llm_provider: The LLM provider to use for reasoning
             tools: List of tools available to the agent
             max_iterations: Maximum number of reasoning iterations
+            history_window: Number of most recent steps (LLM response and
+                observation) sent to the LLM besides the system prompt and
+                the task. Older steps are dropped. None keeps the full history.
+            summarize: Whether to replace dropped steps with a summary
+                generated by the LLM instead of discarding them. The history
+                then grows to twice the window before being trimmed, so that
+                a summary is made every ``history_window`` steps.
+            early_exit_json: Whether to ask the provider to stop generating
+                as soon as the response holds a complete JSON action (the
+                provider's ``generate`` must accept ``early_exit_json``, as
+                :class:`~agentexp.llm.OpenRouterProvider` does). Only used by
+                the synchronous :meth:`run`.
         """
         self.llm_provider = llm_provider
         self.tools = {tool.name: tool for tool in tools}
         self.max_iterations = max_iterations
+        self.history_window = history_window
+        self.summarize = summarize
+        self.early_exit_json = early_exit_json
+
+        # The tools are fixed after initialization, so the prompt is built once
+        self._tools_desc = "\n".join(
+            f"- {tool.name}: {tool.description}" for tool in self.tools.values()
+        )
+        self._system_prompt = _SYSTEM_PROMPT_TEMPLATE.format(
+            tools_desc=self._tools_desc
+        )
 
     def _format_tools_description(self) -> str:
         """Format tool descriptions for the LLM prompt."""
-        descriptions = []
-        for tool in self.tools.values():
-            descriptions.append(f"- {tool.name}: {tool.description}")
-        return "\n".join(descriptions)
+        return self._tools_desc
 
     def _create_system_prompt(self) -> str:
         """Create the system prompt that defines the agent's behavior."""
-        tools_desc = self._format_tools_description()
-        return f"""You are a helpful AI assistant that can use tools to \
-accomplish tasks.
+        return self._system_prompt
+
+    def _create_function_calling_prompt(self) -> str:
+        """Create the system prompt used with native function calling."""
+        return (
+            "You are a helpful AI assistant that can use tools to accomplish "
+            "tasks. Call the provided tools when they help, and reply with the "
+            "final answer once the task is complete.\n\n"
+            "Always think step by step and use tools to verify your work when "
+            "possible."
+        )
+
+    def run(self, task: str, verbose: bool = False, fast_path: bool = False) -> str:
+        """
+        Run the agent on a task.
 
-Available tools:
-{tools_desc}
+        Args:
+            task: The task description
+            verbose: Whether to print intermediate steps
+            fast_path: Whether to answer tasks that are a bare arithmetic
+                expression (e.g. "What is 15*23+47?") locally, without
+                calling the LLM
 
-To use a tool, respond with a JSON object in this format:
-{{"tool": "tool_name", "arguments": {{"arg1": "value1", "arg2": "value2"}}}}
+        Returns:
+            The final answer
 
-When you have completed the task, respond with:
-{{"final_answer": "your answer here"}}
+        Raises:
+            RuntimeError: If max iterations exceeded or task fails
+        """
+        if fast_path:
+            answer = self._try_fast_path(task, verbose)
+            if answer is not None:
+                return answer
 
-Always think step by step and use tools to verify your work when possible.
-"""
+        if self.llm_provider.supports_function_calling:
+            return self._run_function_calling(task, verbose)
+
+        messages = self._initial_messages(task)
+
+        for iteration in range(self.max_iterations):
+            if verbose:
+                print(f"\n=== Iteration {iteration + 1} ===")
+
+            # Get LLM response
+            if self.early_exit_json:
+                response = self.llm_provider.generate(messages, early_exit_json=True)
+            else:
+                response = self.llm_provider.generate(messages)
+
+            if verbose:
+                print(f"Agent: {response}")
+
+            action = self._handle_response(messages, response, verbose)
+            if action is not None:
+                return action["final_answer"]
+            self._trim_history(messages)
+
+        raise RuntimeError(f"Max iterations ({self.max_iterations}) exceeded")
 
-    def run(self, task: str, verbose: bool = False) -> str:
+    async def arun(
+        self, task: str, verbose: bool = False, fast_path: bool = False
+    ) -> str:
         """
-        Run the agent on a task.
+        Run the agent on a task asynchronously.
+
+        Same as :meth:`run`, but awaits the LLM provider's ``agenerate`` so
+        that several tasks can wait on the API concurrently.
 
         Args:
             task: The task description
             verbose: Whether to print intermediate steps
+            fast_path: Whether to answer tasks that are a bare arithmetic
+                expression locally, without calling the LLM
 
         Returns:
             The final answer
@@ -83,76 +295,563 @@ Always think step by step and use tools to verify your work when possible.
         Raises:
             RuntimeError: If max iterations exceeded or task fails
         """
-        messages = [
-            {"role": "system", "content": self._create_system_prompt()},
-            {"role": "user", "content": task},
-        ]
+        if fast_path:
+            answer = self._try_fast_path(task, verbose)
+            if answer is not None:
+                return answer
+
+        return await self._arun(task, verbose)
+
+    async def _arun(
+        self,
+        task: str,
+        verbose: bool = False,
+        rate_limiter: Optional["_RateLimiter"] = None,
+    ) -> str:
+        """Run the agent asynchronously, pacing LLM calls with a rate limiter."""
+        if self.llm_provider.supports_function_calling:
+            return await self._arun_function_calling(task, verbose, rate_limiter)
+
+        messages = self._initial_messages(task)
 
         for iteration in range(self.max_iterations):
             if verbose:
                 print(f"\n=== Iteration {iteration + 1} ===")
 
             # Get LLM response
-            response = self.llm_provider.generate(messages)
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            response = await self.llm_provider.agenerate(messages)
 
             if verbose:
                 print(f"Agent: {response}")
 
-            # Add assistant response to messages
-            messages.append({"role": "assistant", "content": response})
+            action = self._handle_response(messages, response, verbose)
+            if action is not None:
+                return action["final_answer"]
+            await self._atrim_history(messages, rate_limiter)
 
-            # Try to parse as JSON
+        raise RuntimeError(f"Max iterations ({self.max_iterations}) exceeded")
+
+    def run_batch(
+        self,
+        tasks: list[str],
+        max_concurrency: int = 8,
+        rate_limit_rpm: Optional[float] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        return_exceptions: bool = False,
+    ) -> list[Union[str, BaseException]]:
+        """
+        Run the agent on several tasks concurrently.
+
+        Synchronous wrapper around :meth:`run_batch_async`.
+
+        Args:
+            tasks: The task descriptions
+            max_concurrency: Maximum number of tasks running at the same time
+            rate_limit_rpm: Maximum number of LLM requests per minute
+                (None means no limit)
+            on_progress: Optional callback called with (done, total) each time
+                a task completes
+            return_exceptions: Whether to return the error of a failed task in
+                place of its answer instead of raising it
+
+        Returns:
+            The final answers, in the same order as the tasks
+
+        Raises:
+            ValueError: If ``max_concurrency`` or ``rate_limit_rpm`` is not
+                positive
+            Exception: The error of the first failed task, in task order, when
+                ``return_exceptions`` is False. It is raised once every task
+                has finished, so the other tasks still run to completion.
+        """
+        return asyncio.run(
+            self.run_batch_async(
+                tasks, max_concurrency, rate_limit_rpm, on_progress, return_exceptions
+            )
+        )
+
+    async def run_batch_async(
+        self,
+        tasks: list[str],
+        max_concurrency: int = 8,
+        rate_limit_rpm: Optional[float] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        return_exceptions: bool = False,
+    ) -> list[Union[str, BaseException]]:
+        """
+        Run the agent on several tasks concurrently.
+
+        The provider's pooled asynchronous client, if it has one, is closed
+        before returning, since it cannot be reused from another event loop.
+
+        Args:
+            tasks: The task descriptions
+            max_concurrency: Maximum number of tasks running at the same time
+            rate_limit_rpm: Maximum number of LLM requests per minute
+                (None means no limit)
+            on_progress: Optional callback called with (done, total) each time
+                a task completes
+            return_exceptions: Whether to return the error of a failed task in
+                place of its answer instead of raising it
+
+        Returns:
+            The final answers, in the same order as the tasks
+
+        Raises:
+            ValueError: If ``max_concurrency`` or ``rate_limit_rpm`` is not
+                positive
+            Exception: The error of the first failed task, in task order, when
+                ``return_exceptions`` is False. It is raised once every task
+                has finished, so the other tasks still run to completion.
+        """
+        if max_concurrency <= 0:
+            raise ValueError(f"max_concurrency must be positive, got {max_concurrency}")
+        if rate_limit_rpm is not None and rate_limit_rpm <= 0:
+            raise ValueError(f"rate_limit_rpm must be positive, got {rate_limit_rpm}")
+        semaphore = asyncio.Semaphore(max_concurrency)
+        rate_limiter = _RateLimiter(rate_limit_rpm) if rate_limit_rpm else None
+        done = 0
+
+        async def run_task(task: str) -> str:
+            nonlocal done
             try:
-                action = self._parse_action(response)
-            except json.JSONDecodeError:
-                # If not JSON, ask for clarification
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": "Please respond with a valid JSON object.",
-                    }
-                )
-                continue
-
-            # Check for final answer
-            if "final_answer" in action:
-                return action["final_answer"]
+                async with semaphore:
+                    return await self._arun(task, rate_limiter=rate_limiter)
+            finally:
+                done += 1
+                if on_progress is not None:
+                    on_progress(done, len(tasks))
+
+        try:
+            # Errors are collected so that one failed task does not discard
+            # the answers of the others
+            results = await asyncio.gather(
+                *(run_task(task) for task in tasks), return_exceptions=True
+            )
+        finally:
+            aclose = getattr(self.llm_provider, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        return list(results)
+
+    def _run_function_calling(self, task: str, verbose: bool = False) -> str:
+        """
+        Run the agent using the provider's native function calling.
 
-            # Execute tool
-            if "tool" in action:
-                tool_name = action["tool"]
-                tool_args = action.get("arguments", {})
+        The model requests tools through structured ``tool_calls`` instead of
+        JSON actions in its text, so no response parsing or format reminders
+        are needed. Tool results are sent back as ``tool`` messages.
 
-                if tool_name not in self.tools:
-                    error_msg = f"Unknown tool: {tool_name}"
-                    if verbose:
-                        print(f"Error: {error_msg}")
-                    messages.append({"role": "user", "content": error_msg})
-                    continue
+        Args:
+            task: The task description
+            verbose: Whether to print intermediate steps
 
-                try:
-                    result = self.tools[tool_name].execute(**tool_args)
-                    result_msg = f"Tool result: {result}"
-                    if verbose:
-                        print(result_msg)
-                    messages.append({"role": "user", "content": result_msg})
-                except Exception as e:
-                    error_msg = f"Tool error: {str(e)}"
-                    if verbose:
-                        print(error_msg)
-                    messages.append({"role": "user", "content": error_msg})
-            else:
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": (
-                            "Please specify a tool to use or provide a final_answer."
-                        ),
-                    }
-                )
+        Returns:
+            The final answer
+
+        Raises:
+            RuntimeError: If max iterations exceeded
+        """
+        tools = [tool.to_function_schema() for tool in self.tools.values()]
+        messages = self._initial_function_calling_messages(task)
+
+        for iteration in range(self.max_iterations):
+            if verbose:
+                print(f"\n=== Iteration {iteration + 1} ===")
+
+            message = self.llm_provider.generate_with_tools(messages, tools)
+            answer = self._handle_tool_message(messages, message, verbose)
+            if answer is not None:
+                return answer
+
+        raise RuntimeError(f"Max iterations ({self.max_iterations}) exceeded")
+
+    async def _arun_function_calling(
+        self,
+        task: str,
+        verbose: bool = False,
+        rate_limiter: Optional["_RateLimiter"] = None,
+    ) -> str:
+        """
+        Run the agent with native function calling, from an event loop.
+
+        Same as :meth:`_run_function_calling`, but each request runs in a
+        worker thread and first waits for the rate limiter, if any.
+        """
+        tools = [tool.to_function_schema() for tool in self.tools.values()]
+        messages = self._initial_function_calling_messages(task)
+
+        for iteration in range(self.max_iterations):
+            if verbose:
+                print(f"\n=== Iteration {iteration + 1} ===")
+
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            message = await asyncio.to_thread(
+                self.llm_provider.generate_with_tools, messages, tools
+            )
+            answer = self._handle_tool_message(messages, message, verbose)
+            if answer is not None:
+                return answer
 
         raise RuntimeError(f"Max iterations ({self.max_iterations}) exceeded")
 
+    def _initial_function_calling_messages(self, task: str) -> list[dict[str, Any]]:
+        """Create the conversation a function-calling run starts from."""
+        return [
+            {"role": "system", "content": self._create_function_calling_prompt()},
+            {"role": "user", "content": task},
+        ]
+
+    def _handle_tool_message(
+        self, messages: list[dict[str, Any]], message: dict[str, Any], verbose: bool
+    ) -> Optional[str]:
+        """
+        Process an assistant message of a function-calling run.
+
+        Runs the requested tools and appends the assistant message and the
+        tool results to the conversation.
+
+        Args:
+            messages: The conversation, updated in place
+            message: The assistant message returned by the provider
+            verbose: Whether to print intermediate steps
+
+        Returns:
+            The final answer if the message requests no tools, otherwise None
+        """
+        tool_calls = message.get("tool_calls")
+
+        if verbose and message.get("content"):
+            print(f"Agent: {message['content']}")
+
+        if not tool_calls:
+            return message.get("content") or ""
+
+        messages.append(
+            {
+                "role": "assistant",
+                "content": message.get("content"),
+                "tool_calls": tool_calls,
+            }
+        )
+
+        calls = []
+        for tool_call in tool_calls:
+            function = tool_call.get("function", {})
+            arguments = function.get("arguments") or {}
+            # Most providers send the arguments as a JSON string, some
+            # already decoded
+            if not isinstance(arguments, dict):
+                try:
+                    arguments = loads(arguments)
+                except (json.JSONDecodeError, TypeError):
+                    arguments = {}
+            if not isinstance(arguments, dict):
+                arguments = {}
+            calls.append({"tool": function.get("name"), "arguments": arguments})
+
+        for tool_call, result in zip(tool_calls, self._run_tool_calls(calls)):
+            if verbose:
+                print(f"Tool result: {result}")
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_call.get("id"),
+                    "content": str(result),
+                }
+            )
+        return None
+
+    def _try_fast_path(self, task: str, verbose: bool = False) -> Optional[str]:
+        """
+        Answer a pure arithmetic task locally.
+
+        Args:
+            task: The task description
+            verbose: Whether to print intermediate steps
+
+        Returns:
+            The result of the expression, or None if the task is not a bare
+            arithmetic expression the calculator can evaluate
+        """
+        match = _ARITHMETIC_TASK.match(task)
+        if match is None:
+            return None
+        expression = match.group(1).replace("^", "**")
+        if not any(char.isdigit() for char in expression):
+            return None
+        if not _has_bounded_powers(expression):
+            return None
+        try:
+            # str() also refuses integers too long to convert quickly
+            answer = str(_CALCULATOR.execute(expression))
+        except ValueError:
+            return None
+        if verbose:
+            print(f"Fast path: {expression.strip()} = {answer}")
+        return answer
+
+    def _initial_messages(self, task: str) -> list[dict[str, str]]:
+        """Create the conversation a run starts from."""
+        return [
+            {"role": "system", "content": self._create_system_prompt()},
+            {"role": "user", "content": task},
+        ]
+
+    def _trim_history(self, messages: list[dict[str, str]]) -> None:
+        """
+        Bound the conversation to the last ``history_window`` steps.
+
+        The system prompt and the task are always kept. Without trimming,
+        every request resends all previous steps and input tokens grow
+        quadratically with the number of iterations.
+
+        Args:
+            messages: The conversation, trimmed in place
+        """
+        split = self._split_history(messages)
+        if split is None:
+            return
+        dropped, kept = split
+        summary = []
+        if self.summarize:
+            content = self.llm_provider.generate(self._summary_request(dropped))
+            summary = [{"role": "user", "content": f"{_SUMMARY_PREFIX} {content}"}]
+        messages[2:] = summary + kept
+
+    async def _atrim_history(
+        self,
+        messages: list[dict[str, str]],
+        rate_limiter: Optional["_RateLimiter"] = None,
+    ) -> None:
+        """
+        Asynchronous counterpart of :meth:`_trim_history`.
+
+        The summary request, if any, awaits the provider's ``agenerate``
+        after waiting for the rate limiter.
+
+        Args:
+            messages: The conversation, trimmed in place
+            rate_limiter: Optional rate limiter pacing the summary request
+        """
+        split = self._split_history(messages)
+        if split is None:
+            return
+        dropped, kept = split
+        summary = []
+        if self.summarize:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            content = await self.llm_provider.agenerate(self._summary_request(dropped))
+            summary = [{"role": "user", "content": f"{_SUMMARY_PREFIX} {content}"}]
+        messages[2:] = summary + kept
+
+    def _split_history(
+        self, messages: list[dict[str, str]]
+    ) -> Optional[tuple[list[dict[str, str]], list[dict[str, str]]]]:
+        """
+        Split the steps of a conversation into those to drop and those to keep.
+
+        Args:
+            messages: The conversation
+
+        Returns:
+            The dropped and kept messages after the task, or None if the
+            conversation fits in the history window
+        """
+        if self.history_window is None:
+            return None
+        # Each step is an LLM response followed by an observation
+        keep = 2 * self.history_window
+        # A summary of earlier steps, if any, sits right after the task
+        head = 2
+        if len(messages) > 2 and str(messages[2]["content"]).startswith(
+            _SUMMARY_PREFIX
+        ):
+            head = 3
+        # Summaries cost an LLM call, so when summarizing the history grows to
+        # twice the window before being trimmed back: one summary per
+        # ``history_window`` steps instead of one per step
+        limit = 2 * keep - 1 if self.summarize else keep
+        if len(messages) - head <= limit:
+            return None
+
+        # A previous summary is dropped too, so that it gets folded in the new one
+        return messages[2 : len(messages) - keep], messages[len(messages) - keep :]
+
+    def _summary_request(self, steps: list[dict[str, str]]) -> list[dict[str, str]]:
+        """
+        Build the messages asking the LLM to summarize conversation steps.
+
+        Args:
+            steps: The messages to summarize, possibly starting with an
+                earlier summary
+
+        Returns:
+            The messages of the summary request
+        """
+        transcript = "\n".join(f"{step['role']}: {step['content']}" for step in steps)
+        return [
+            {
+                "role": "system",
+                "content": (
+                    "Summarize these steps of an agent working on a task. "
+                    "Be concise but keep every tool result and intermediate "
+                    "value needed to finish the task."
+                ),
+            },
+            {"role": "user", "content": transcript},
+        ]
+
+    def _handle_response(
+        self, messages: list[dict[str, str]], response: str, verbose: bool
+    ) -> Optional[dict[str, Any]]:
+        """
+        Process one LLM response: record it, then execute the requested tools.
+
+        The response and the resulting observation are appended to
+        ``messages``.
+
+        Args:
+            messages: The conversation so far
+            response: The LLM response text
+            verbose: Whether to print intermediate steps
+
+        Returns:
+            The final answer action if the task is complete, None otherwise
+        """
+        # Add assistant response to messages
+        messages.append({"role": "assistant", "content": response})
+
+        # Try to parse as JSON
+        try:
+            action = self._parse_action(response)
+        except json.JSONDecodeError:
+            # If not JSON, ask for clarification
+            messages.append(
+                {
+                    "role": "user",
+                    "content": "Please respond with a valid JSON object.",
+                }
+            )
+            return None
+
+        # Check for final answer
+        if "final_answer" in action:
+            return action
+
+        # Execute several independent tools concurrently
+        calls = action.get("tools")
+        if (
+            isinstance(calls, list)
+            and calls
+            and all(isinstance(call, dict) for call in calls)
+        ):
+            result_msg = self._execute_tool_calls(calls)
+            if verbose:
+                print(result_msg)
+            messages.append({"role": "user", "content": result_msg})
+
+        # Execute tool
+        elif "tool" in action:
+            tool_name = action["tool"]
+            tool_args = action.get("arguments", {})
+
+            if not isinstance(tool_name, str) or tool_name not in self.tools:
+                error_msg = f"Unknown tool: {tool_name}"
+                if verbose:
+                    print(f"Error: {error_msg}")
+                messages.append({"role": "user", "content": error_msg})
+                return None
+
+            try:
+                result = self.tools[tool_name].execute(**tool_args)
+                result_msg = f"Tool result: {result}"
+                if verbose:
+                    print(result_msg)
+                messages.append({"role": "user", "content": result_msg})
+            except Exception as e:
+                error_msg = f"Tool error: {str(e)}"
+                if verbose:
+                    print(error_msg)
+                messages.append({"role": "user", "content": error_msg})
+        else:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": (
+                        "Please specify a tool to use or provide a final_answer."
+                    ),
+                }
+            )
+
+        return None
+
+    def _run_tool_call(self, call: dict[str, Any]) -> Any:
+        """
+        Execute a single tool call from a batch.
+
+        Errors are returned as messages rather than raised, so that one
+        failing call does not discard the results of the others.
+
+        Args:
+            call: Dictionary with the "tool" name and its "arguments"
+
+        Returns:
+            The tool result, or an error message
+        """
+        tool_name = call.get("tool")
+        # The name comes from the model and may not even be hashable
+        if not isinstance(tool_name, str) or tool_name not in self.tools:
+            return f"Unknown tool: {tool_name}"
+        try:
+            return self.tools[tool_name].execute(**call.get("arguments", {}))
+        except Exception as e:
+            return f"Tool error: {str(e)}"
+
+    def _run_tool_calls(self, calls: list[dict[str, Any]]) -> list[Any]:
+        """
+        Execute independent tool calls concurrently.
+
+        Args:
+            calls: List of dictionaries with the "tool" name and its "arguments"
+
+        Returns:
+            The results (or error messages), in the same order as the calls
+        """
+        if len(calls) == 1:
+            return [self._run_tool_call(calls[0])]
+        with ThreadPoolExecutor(
+            max_workers=min(len(calls), _MAX_TOOL_WORKERS)
+        ) as executor:
+            return list(executor.map(self._run_tool_call, calls))
+
+    def _execute_tool_calls(self, calls: list[dict[str, Any]]) -> str:
+        """
+        Execute independent tool calls and report their results.
+
+        Args:
+            calls: List of dictionaries with the "tool" name and its "arguments"
+
+        Returns:
+            A single observation message holding a JSON array with the name
+            and result of each call
+        """
+        results = self._run_tool_calls(calls)
+        payload = [
+            {"name": call.get("tool"), "result": _json_safe(result)}
+            for call, result in zip(calls, results)
+        ]
+        return f"Tool results: {dumps(payload).decode()}"
+
     def _parse_action(self, response: str) -> dict[str, Any]:
         """
         Parse the agent's response to extract the action.
@@ -164,11 +863,19 @@ Always think step by step and use tools to verify your work when possible.
             Parsed action dictionary
 
         Raises:
-            json.JSONDecodeError: If response is not valid JSON
-        """
-        # Try to find JSON in the response
-        json_match = re.search(r"\{.*\}", response, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        # If no JSON found, try to parse the whole response
-        return json.loads(response)
+            json.JSONDecodeError: If response contains no valid JSON object
+        """
+        # Fast path: the whole response is a JSON object
+        try:
+            action = loads(response)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(action, dict):
+                return action
+
+        # Otherwise decode the first complete JSON object found in the text
+        found = find_json_object(response)
+        if found is None:
+            raise json.JSONDecodeError("No JSON object found", response, 0)
+        return found[0]
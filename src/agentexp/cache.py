@@ -0,0 +1,150 @@
+"""
+Response caches for LLM providers.
+
+Identical requests to an LLM (same model, parameters and messages) are common
+while developing an agent: the same task is often rerun verbatim. The caches
+in this module store generated responses under a deterministic key so that a
+provider can skip the API call entirely on a repeated request.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def make_cache_key(**request: Any) -> str:
+    """
+    Build a deterministic cache key for an LLM request.
+
+    Args:
+        **request: The request fields (model, messages, parameters, ...)
+
+    Returns:
+        The SHA256 hex digest of the canonical JSON encoding of the request
+    """
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Abstract base class for response caches.
+
+    A cache maps request keys to response texts. Entries older than the
+    ``ttl`` given to :meth:`get` are treated as missing.
+    """
+
+    @abstractmethod
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: The request key
+            ttl: Maximum age of the entry in seconds (None means no expiry)
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, response: str) -> None:
+        """
+        Store a response.
+
+        Args:
+            key: The request key
+            response: The response text to cache
+        """
+        pass
+
+
+class InMemoryCache(ResponseCache):
+    """
+    A bounded in-memory LRU cache.
+
+    Entries live for the lifetime of the process; the least recently used
+    entry is evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries to keep
+        """
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            response, timestamp = entry
+            if ttl is not None and time.time() - timestamp > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        with self._lock:
+            self._entries[key] = (response, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache(ResponseCache):
+    """
+    A persistent cache backed by a SQLite database.
+
+    Useful to keep responses across runs, e.g. when rerunning the same
+    examples during development.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Path to the SQLite database file (created if missing)
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+            )
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        query = "SELECT response FROM cache WHERE key = ?"
+        params: tuple[Any, ...] = (key,)
+        if ttl is not None:
+            query += " AND ts >= ?"
+            params += (int(time.time() - ttl),)
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, response: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, response, ts) VALUES (?, ?, ?)",
+                (key, response, int(time.time())),
+            )
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self._conn.close()
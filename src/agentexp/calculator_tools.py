@@ -5,20 +5,113 @@ These tools provide access to Python's math functions and allow
 the agent to perform and verify computations.
 """
 
+import ast
+import copy
+import functools
 import math
-from typing import Union
+from types import CodeType
+from typing import Any, Callable, ClassVar, Optional, Union
 
 from agentexp.tools import Tool
 
+# Functions that calculator expressions may call
+_SAFE_FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "pow": pow,
+}
+
+# Syntax allowed in calculator expressions: numbers, arithmetic operators,
+# and calls to the safe functions
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Constant,
+    ast.Call,
+    ast.keyword,
+    ast.Name,
+    ast.Load,
+    ast.Tuple,
+    ast.List,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_expression(expression: str) -> CodeType:
+    """
+    Parse, validate and compile a calculator expression.
+
+    Compiled expressions are cached, so repeated expressions skip parsing.
+
+    Args:
+        expression: The mathematical expression
+
+    Returns:
+        The compiled expression
+
+    Raises:
+        SyntaxError: If the expression cannot be parsed
+        ValueError: If the expression uses unsupported syntax or names
+    """
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"unsupported syntax {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in _SAFE_FUNCTIONS:
+            raise ValueError(f"unknown name {node.id!r}")
+        if isinstance(node, ast.Constant) and not isinstance(
+            node.value, (int, float, complex)
+        ):
+            raise ValueError(f"unsupported constant {node.value!r}")
+    return compile(tree, "<calc>", "eval")
+
+
+@functools.lru_cache(maxsize=1024)
+def _try_compile_expression(expression: str) -> Optional[CodeType]:
+    """
+    Compile a calculator expression, returning None if it is invalid.
+
+    Unlike :func:`_compile_expression`, whose cache cannot hold exceptions,
+    invalid expressions are cached too, so repeating one skips parsing.
+
+    Args:
+        expression: The mathematical expression
+
+    Returns:
+        The compiled expression, or None if it is invalid or unsafe
+    """
+    try:
+        return _compile_expression(expression)
+    except (SyntaxError, ValueError):
+        return None
+
 
 class CalculatorTool(Tool):
     """
     A tool for performing basic arithmetic calculations.
 
     This tool can evaluate mathematical expressions and return the result.
-    It uses Python's eval with a restricted namespace for safety.
+    Expressions are checked against a whitelist of syntax (numbers, arithmetic
+    operators and a few safe functions) before being evaluated.
     """
 
+    # Evaluation namespace with only allowed operations. It is shared between
+    # calls: validated expressions cannot assign names, so it is never mutated.
+    _NAMESPACE = {"__builtins__": {}, **_SAFE_FUNCTIONS}
+
     @property
     def name(self) -> str:
         return "calculator"
@@ -44,22 +137,30 @@ class CalculatorTool(Tool):
         Raises:
             ValueError: If the expression is invalid or unsafe
         """
-        # Create a safe namespace with only allowed operations
-        safe_namespace = {
-            "__builtins__": {},
-            "abs": abs,
-            "round": round,
-            "min": min,
-            "max": max,
-            "sum": sum,
-            "pow": pow,
-        }
-
         try:
-            result = eval(expression, safe_namespace, {})
-            return result
+            result = self._eval_cached(expression)
         except Exception as e:
             raise ValueError(f"Invalid expression: {str(e)}") from e
+        # Lists and tuples (e.g. "[1, 2]") are copied, so that a caller
+        # mutating its result does not change the cached one
+        if not isinstance(result, (int, float, complex)):
+            result = copy.deepcopy(result)
+        return result
+
+    @classmethod
+    @functools.lru_cache(maxsize=4096, typed=True)
+    def _eval_cached(cls, expression: str) -> Union[float, int]:
+        """
+        Evaluate an expression, memoizing results of repeated expressions.
+
+        The class is part of the cache key, so a subclass overriding
+        ``_NAMESPACE`` gets its own results.
+        """
+        return eval(_compile_expression(expression), cls._NAMESPACE)
+
+
+# Shared instance used by the tools that evaluate expressions
+_CALCULATOR = CalculatorTool()
 
 
 class MathFunctionTool(Tool):
@@ -70,6 +171,44 @@ class MathFunctionTool(Tool):
     from Python's math module.
     """
 
+    # Map of allowed functions, so that dispatch is a single dict lookup
+    _FUNCS: ClassVar[dict[str, Callable[[float], float]]] = {
+        "sqrt": math.sqrt,
+        "sin": math.sin,
+        "cos": math.cos,
+        "tan": math.tan,
+        "log": math.log,
+        "log10": math.log10,
+        "exp": math.exp,
+        "floor": math.floor,
+        "ceil": math.ceil,
+        "factorial": math.factorial,
+        "degrees": math.degrees,
+        "radians": math.radians,
+        "abs": abs,
+    }
+    _AVAIL_MSG = ", ".join(_FUNCS)
+
+    # Functions applied by execute_batch with the NumPy ufunc of the same name.
+    # factorial has none, and abs is left out as it keeps ints as ints
+    _NP_FUNCS = frozenset(
+        {
+            "sqrt",
+            "sin",
+            "cos",
+            "tan",
+            "log",
+            "log10",
+            "exp",
+            "floor",
+            "ceil",
+            "degrees",
+            "radians",
+        }
+    )
+    # Functions whose scalar versions return ints rather than floats
+    _INT_FUNCS = frozenset({"floor", "ceil"})
+
     @property
     def name(self) -> str:
         return "math_function"
@@ -97,34 +236,140 @@ class MathFunctionTool(Tool):
         Raises:
             ValueError: If the function is unknown or invalid
         """
-        # Map of allowed functions
-        allowed_functions = {
-            "sqrt": math.sqrt,
-            "sin": math.sin,
-            "cos": math.cos,
-            "tan": math.tan,
-            "log": math.log,
-            "log10": math.log10,
-            "exp": math.exp,
-            "floor": math.floor,
-            "ceil": math.ceil,
-            "factorial": math.factorial,
-            "degrees": math.degrees,
-            "radians": math.radians,
-            "abs": abs,
-        }
-
-        if function not in allowed_functions:
-            available = ", ".join(allowed_functions.keys())
-            raise ValueError(f"Unknown function: {function}. Available: {available}")
+        func = self._FUNCS.get(function)
+        if func is None:
+            raise ValueError(
+                f"Unknown function: {function}. Available: {self._AVAIL_MSG}"
+            )
 
         try:
-            func = allowed_functions[function]
-            result = func(value)
-            return result
+            return self._apply_cached(func, value)
         except Exception as e:
             raise ValueError(f"Error applying {function} to {value}: {str(e)}") from e
 
+    @staticmethod
+    @functools.lru_cache(maxsize=4096, typed=True)
+    def _apply_cached(func: Callable[[float], float], value: float) -> float:
+        """
+        Apply a math function, memoizing results of repeated calls.
+
+        Results are keyed on the function itself rather than its name, so a
+        subclass overriding ``_FUNCS`` gets its own results. The cache is typed
+        so that e.g. ``factorial(5)`` and ``factorial(5.0)`` are distinct
+        entries, as the math functions treat them differently.
+        """
+        return func(value)
+
+    def execute_batch(self, function: str, values: list[float]) -> Any:
+        """
+        Apply a math function to many values at once.
+
+        Uses the corresponding NumPy ufunc over a contiguous float64 array,
+        which is much faster than calling :meth:`execute` for each value.
+        Values that do not fit in float64 (e.g. ``None`` or huge ints) are
+        processed one by one with :meth:`execute` instead, so that results
+        and errors always match the scalar tool. NumPy is only imported on
+        the first call.
+
+        Args:
+            function: Name of the math function to apply
+            values: The input values
+
+        Returns:
+            A NumPy array with the results, of integers for floor and ceil
+            like the scalar functions
+
+        Raises:
+            ValueError: If the function is unknown, a value is invalid or a
+                result overflows
+            ImportError: If NumPy is not installed
+        """
+        if function not in self._FUNCS:
+            raise ValueError(
+                f"Unknown function: {function}. Available: {self._AVAIL_MSG}"
+            )
+        try:
+            import numpy as np
+        except ImportError:  # pragma: no cover - optional dependency
+            raise ImportError(
+                "Batch evaluation requires NumPy. "
+                "Install it with: pip install agentexp[batch]"
+            ) from None
+
+        array = None
+        # np.asarray would turn None into nan and strings into numbers
+        if function in self._NP_FUNCS and all(
+            isinstance(value, (int, float)) for value in values
+        ):
+            try:
+                array = np.asarray(values, dtype=np.float64)
+            except OverflowError:
+                pass
+        if array is None:
+            results = [self.execute(function, value) for value in values]
+            # An object array keeps each result's type, e.g. ints from abs
+            return np.array(results, dtype=object)
+
+        try:
+            # Match the math module, which raises instead of returning nan/inf
+            with np.errstate(invalid="raise", divide="raise", over="raise"):
+                result = getattr(np, function)(array)
+        except FloatingPointError as e:
+            raise ValueError(f"Error applying {function} to {values}: {str(e)}") from e
+
+        if function not in self._INT_FUNCS:
+            return result
+        if not np.isfinite(result).all():
+            raise ValueError(
+                f"Error applying {function} to {values}: "
+                "cannot convert infinity or NaN to integer"
+            )
+        if np.abs(result).max(initial=0) < 2**63:
+            return result.astype(np.int64)
+        # Python ints, as int64 cannot hold these values
+        return np.array([int(item) for item in result], dtype=object)
+
+
+# Shared instance used by the batch tool
+_MATH_FUNCTION = MathFunctionTool()
+
+
+class MathFunctionBatchTool(Tool):
+    """
+    A tool for applying a math function to a list of numbers.
+
+    Saves the agent one tool call per value when the same function must be
+    applied to many numbers. Requires NumPy.
+    """
+
+    @property
+    def name(self) -> str:
+        return "math_function_batch"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Applies a mathematical function to each number of a list. "
+            "Available functions: same as math_function. "
+            "Example: math_function_batch(function='sqrt', values=[4, 9, 16])"
+        )
+
+    def execute(self, function: str, values: list[float]) -> list[float]:
+        """
+        Apply a math function to a list of values.
+
+        Args:
+            function: Name of the math function to apply
+            values: The input values
+
+        Returns:
+            The results, in the same order as the values
+
+        Raises:
+            ValueError: If the function is unknown or a value is invalid
+        """
+        return _MATH_FUNCTION.execute_batch(function, values).tolist()
+
 
 class VerifyCalculationTool(Tool):
     """
@@ -157,12 +402,16 @@ class VerifyCalculationTool(Tool):
         Returns:
             True if the calculation is correct, False otherwise
         """
-        calculator = CalculatorTool()
         try:
-            actual = calculator.execute(expression)
-            # Use approximate equality for floating point
+            # Invalid expressions are cached as None, so rejecting a repeated
+            # one costs a cache lookup instead of a parse and an exception
+            if _try_compile_expression(expression) is None:
+                return False
+            actual = _CALCULATOR.execute(expression)
+            # Use approximate equality for floating point, relative to the
+            # magnitude of the values (with an absolute floor near zero)
             if isinstance(actual, float) or isinstance(expected, float):
-                return abs(actual - expected) < 1e-9
+                return math.isclose(actual, expected, rel_tol=1e-9, abs_tol=1e-9)
             return actual == expected
         except Exception:
             return False
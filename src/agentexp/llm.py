@@ -5,11 +5,59 @@ This module provides an abstract interface for LLM providers and concrete
 implementations for popular services like OpenRouter.
 """
 
+import asyncio
+import importlib.util
 import os
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+from agentexp._json import dumps, find_json_object, loads
+from agentexp.cache import InMemoryCache, ResponseCache, SQLiteCache, make_cache_key
+
+_HAS_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Rate limiting and transient server errors are worth retrying
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+_RETRY_BACKOFF = 0.5
+
+
+def _mark_cacheable(message: dict[str, Any]) -> dict[str, Any]:
+    """
+    Mark a system message for provider-side prompt caching.
+
+    The text content is wrapped in a content part carrying an ephemeral
+    ``cache_control`` marker, which OpenRouter forwards to providers that
+    support prompt caching. Other messages are returned unchanged.
+    """
+    if message.get("role") != "system" or not isinstance(message.get("content"), str):
+        return message
+    return {
+        **message,
+        "content": [
+            {
+                "type": "text",
+                "text": message["content"],
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+    }
+
+
+def _retry_delay(response: Any, attempt: int) -> float:
+    """Seconds to wait before retrying, honoring a numeric Retry-After header."""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        return _RETRY_BACKOFF * 2**attempt
 
 
 class LLMProvider(ABC):
@@ -18,8 +66,14 @@ class LLMProvider(ABC):
 
     This allows the agent to work with any LLM service by implementing
     a simple interface.
+
+    Providers with native function calling set ``supports_function_calling``
+    and implement :meth:`generate_with_tools`; the agent then lets the model
+    call tools directly instead of parsing JSON actions out of the text.
     """
 
+    supports_function_calling: bool = False
+
     @abstractmethod
     def generate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
         """
@@ -34,6 +88,47 @@ class LLMProvider(ABC):
         """
         pass
 
+    async def agenerate(self, messages: list[dict[str, str]], **kwargs: Any) -> str:
+        """
+        Asynchronously generate a response from the LLM.
+
+        The default implementation runs :meth:`generate` in a worker thread.
+        Providers with a native asynchronous client should override it.
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            **kwargs: Provider-specific generation parameters
+
+        Returns:
+            The generated text response
+        """
+        return await asyncio.to_thread(self.generate, messages, **kwargs)
+
+    def generate_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """
+        Generate a response that may call tools natively.
+
+        Args:
+            messages: List of message dictionaries, possibly including
+                assistant ``tool_calls`` and ``tool`` result messages
+            tools: Tool schemas in the function-calling format
+            **kwargs: Provider-specific generation parameters
+
+        Returns:
+            The assistant message, with 'content' and optional 'tool_calls'
+
+        Raises:
+            NotImplementedError: If the provider has no function calling
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support function calling"
+        )
+
 
 class OpenRouterProvider(LLMProvider):
     """
@@ -48,6 +143,14 @@ class OpenRouterProvider(LLMProvider):
         api_key: Optional[str] = None,
         model: str = "google/gemini-2.0-flash-exp:free",
         base_url: str = "https://openrouter.ai/api/v1",
+        cache_backend: Union[None, str, ResponseCache] = None,
+        ttl: Optional[float] = None,
+        enable_semantic: bool = False,
+        semantic_threshold: float = 0.9,
+        prompt_caching: bool = False,
+        function_calling: bool = False,
+        max_retries: int = 3,
+        temperature: float = 0.7,
     ):
         """
         Initialize OpenRouter provider.
@@ -56,6 +159,26 @@ class OpenRouterProvider(LLMProvider):
             api_key: OpenRouter API key. If None, reads from OPENROUTER_API_KEY env var
             model: Model identifier (default: free Google Gemini Flash model)
             base_url: OpenRouter API base URL
+            cache_backend: Response cache for deterministic (temperature 0.0)
+                requests. Either a ResponseCache instance, "memory" for an
+                in-memory LRU cache, or a path to a SQLite database file.
+                None disables caching.
+            ttl: Maximum age in seconds of cached responses (None: no expiry)
+            enable_semantic: Whether to replay responses of semantically
+                similar requests (requires the optional semantic dependencies)
+            semantic_threshold: Minimum cosine similarity between the last
+                messages of two requests for a semantic cache hit (the other
+                messages and the model must be identical)
+            prompt_caching: Whether to mark system messages as cacheable
+                (``cache_control``) so that providers supporting prompt
+                caching reuse the processed prefix across requests
+            function_calling: Whether the agent should use the model's native
+                tool calling (the model must support it on OpenRouter)
+            max_retries: Number of retries, with exponential backoff, of
+                requests rejected by rate limiting (429) or server errors (5xx)
+            temperature: Default sampling temperature of requests that do not
+                set one, such as the agent's. Only requests at temperature 0.0
+                are cached, so set it to 0.0 to cache agent runs.
         """
         self.api_key = api_key or os.environ.get("OPENROUTER_API_KEY")
         if not self.api_key:
@@ -64,13 +187,57 @@ class OpenRouterProvider(LLMProvider):
                 "environment variable. Get a free key at https://openrouter.ai/"
             )
         self.model = model
+        self.temperature = temperature
         self.base_url = base_url
+        self.cache = self._make_cache(cache_backend)
+        self.ttl = ttl
+        self.semantic_cache = None
+        if enable_semantic:
+            from agentexp.semantic_cache import SemanticCache
+
+            self.semantic_cache = SemanticCache(threshold=semantic_threshold)
+        self.prompt_caching = prompt_caching
+        self.supports_function_calling = function_calling
+
+        # Reuse connections (and their TLS handshakes) across requests
+        self._session = requests.Session()
+        self._session.headers.update(self._headers())
+        self.max_retries = max_retries
+        # Only connection failures and retryable statuses are retried: a read
+        # timeout means the request may still be processed (and billed)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=_RETRY_BACKOFF,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._async_client = None
+        self._async_loop = None
+
+    @staticmethod
+    def _make_cache(
+        cache_backend: Union[None, str, ResponseCache],
+    ) -> Optional[ResponseCache]:
+        """Build the response cache from the ``cache_backend`` argument."""
+        if cache_backend is None or isinstance(cache_backend, ResponseCache):
+            return cache_backend
+        if cache_backend == "memory":
+            return InMemoryCache()
+        return SQLiteCache(cache_backend)
 
     def generate(
         self,
         messages: list[dict[str, str]],
-        temperature: float = 0.7,
+        temperature: Optional[float] = None,
         max_tokens: int = 1000,
+        early_exit_json: bool = False,
         **kwargs: Any,
     ) -> str:
         """
@@ -78,22 +245,314 @@ class OpenRouterProvider(LLMProvider):
 
         Args:
             messages: List of message dictionaries with 'role' and 'content'
-            temperature: Sampling temperature (0.0 to 2.0)
+            temperature: Sampling temperature (0.0 to 2.0). None uses the
+                provider's default temperature
+            max_tokens: Maximum tokens to generate
+            early_exit_json: Whether to stream the response and stop as soon
+                as it contains a complete JSON object. The text after that
+                object is never generated, which saves time when only the
+                JSON action is needed (as for the agent).
+            **kwargs: Additional OpenRouter parameters
+
+        Returns:
+            The generated text response
+
+        Raises:
+            requests.HTTPError: If the API request fails
+        """
+        if temperature is None:
+            temperature = self.temperature
+        # Early-exit responses are truncated, so they are cached separately
+        key_kwargs = {**kwargs, "early_exit_json": True} if early_exit_json else kwargs
+        cache_key, semantic_query = self._cache_keys(
+            messages, temperature, max_tokens, **key_kwargs
+        )
+        cached = self._cache_get(cache_key, semantic_query)
+        if cached is not None:
+            return cached
+
+        if early_exit_json:
+            content, complete = self._generate_until_json(
+                messages, temperature, max_tokens, **kwargs
+            )
+            if not complete:
+                # The stream was cut short: do not replay a partial response
+                return content
+        else:
+            response = self._session.post(
+                f"{self.base_url}/chat/completions",
+                headers=self._model_headers(),
+                data=dumps(self._payload(messages, temperature, max_tokens, **kwargs)),
+                timeout=30,
+            )
+            response.raise_for_status()
+
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+
+        self._cache_set(cache_key, semantic_query, content)
+        return content
+
+    def _generate_until_json(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        **kwargs: Any,
+    ) -> tuple[str, bool]:
+        """
+        Stream a response until it contains a complete JSON object.
+
+        The response is received as server-sent events. The connection is
+        closed as soon as the accumulated text holds a complete JSON object,
+        which is returned along with any text preceding it.
+
+        Returns:
+            The response text, up to the end of the first JSON object, and
+            whether the response is complete (it holds a JSON object or the
+            stream ended normally with ``[DONE]``)
+
+        Raises:
+            requests.HTTPError: If the API request fails or the stream
+                reports an error
+        """
+        payload = self._payload(messages, temperature, max_tokens, **kwargs)
+        payload["stream"] = True
+
+        content = ""
+        with self._session.post(
+            f"{self.base_url}/chat/completions",
+            headers=self._model_headers(),
+            data=dumps(payload),
+            timeout=30,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                # Skip keep-alive comments and other non-data SSE fields
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:") :].strip()
+                if data == b"[DONE]":
+                    return content, True
+                chunk = loads(data)
+                # Errors after the response started are sent as an SSE event
+                if chunk.get("error"):
+                    error = chunk["error"]
+                    message = error.get("message") if isinstance(error, dict) else error
+                    raise requests.HTTPError(f"Stream error: {message}")
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+                content += delta
+                # An object can only be complete once a closing brace arrived
+                if "}" in delta:
+                    found = find_json_object(content)
+                    if found is not None:
+                        return content[: found[1]], True
+        return content, False
+
+    async def agenerate(
+        self,
+        messages: list[dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: int = 1000,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Asynchronously generate a response using OpenRouter.
+
+        Requests go through a pooled ``httpx.AsyncClient`` so that concurrent
+        agent runs share keep-alive connections instead of blocking a thread
+        each.
+
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            temperature: Sampling temperature (0.0 to 2.0). None uses the
+                provider's default temperature
             max_tokens: Maximum tokens to generate
             **kwargs: Additional OpenRouter parameters
 
         Returns:
             The generated text response
 
+        Raises:
+            httpx.HTTPStatusError: If the API request fails
+        """
+        if temperature is None:
+            temperature = self.temperature
+        cache_key, semantic_query = self._cache_keys(
+            messages, temperature, max_tokens, **kwargs
+        )
+        cached = self._cache_get(cache_key, semantic_query)
+        if cached is not None:
+            return cached
+
+        client = self._get_async_client()
+        for attempt in range(self.max_retries + 1):
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self._model_headers(),
+                content=dumps(
+                    self._payload(messages, temperature, max_tokens, **kwargs)
+                ),
+            )
+            if (
+                response.status_code not in _RETRY_STATUSES
+                or attempt == self.max_retries
+            ):
+                break
+            await asyncio.sleep(_retry_delay(response, attempt))
+        response.raise_for_status()
+
+        result = response.json()
+        content = result["choices"][0]["message"]["content"]
+        self._cache_set(cache_key, semantic_query, content)
+        return content
+
+    def close(self) -> None:
+        """
+        Close the pooled HTTP connections.
+
+        The asynchronous client is closed too when its event loop is still
+        usable. A client whose loop has already ended cannot be closed from
+        another loop, so asynchronous callers should await :meth:`aclose`
+        before their loop ends (as :meth:`Agent.run_batch` does).
+        """
+        self._session.close()
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        if client is None or loop is None or loop.is_closed():
+            return
+        if loop.is_running():
+            loop.create_task(client.aclose())
+        else:
+            loop.run_until_complete(client.aclose())
+
+    def __enter__(self) -> "OpenRouterProvider":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "OpenRouterProvider":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+        self._session.close()
+
+    def generate_with_tools(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: int = 1000,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """
+        Generate a response using OpenRouter's native tool calling.
+
+        Args:
+            messages: List of message dictionaries, possibly including
+                assistant ``tool_calls`` and ``tool`` result messages
+            tools: Tool schemas in the function-calling format
+            temperature: Sampling temperature (0.0 to 2.0). None uses the
+                provider's default temperature
+            max_tokens: Maximum tokens to generate
+            **kwargs: Additional OpenRouter parameters
+
+        Returns:
+            The assistant message, with 'content' and optional 'tool_calls'
+
         Raises:
             requests.HTTPError: If the API request fails
         """
-        headers = {
+        if temperature is None:
+            temperature = self.temperature
+        response = self._session.post(
+            f"{self.base_url}/chat/completions",
+            headers=self._model_headers(),
+            data=dumps(
+                self._payload(
+                    messages,
+                    temperature,
+                    max_tokens,
+                    tools=tools,
+                    tool_choice="auto",
+                    **kwargs,
+                )
+            ),
+            timeout=30,
+        )
+        response.raise_for_status()
+
+        result = response.json()
+        return result["choices"][0]["message"]
+
+    async def aclose(self) -> None:
+        """Close the pooled asynchronous HTTP client, if any."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    def _get_async_client(self) -> "httpx.AsyncClient":
+        """
+        Return the pooled asynchronous HTTP client for the running event loop.
+
+        An httpx client is bound to the event loop it was first used in, so a
+        new client is created when called from a different loop (e.g. after
+        successive ``asyncio.run`` calls).
+        """
+        if httpx is None:
+            raise ImportError(
+                "Asynchronous generation requires httpx. "
+                "Install it with: pip install agentexp[async]"
+            )
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                headers=self._headers(),
+                http2=_HAS_HTTP2,
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=20),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    def _headers(self) -> dict[str, str]:
+        """Build the HTTP headers shared by every API request."""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
 
-        data = {
+    def _model_headers(self) -> dict[str, str]:
+        """
+        Build the HTTP headers that depend on the model.
+
+        They are sent with each request rather than set on the pooled
+        clients, as the model can be switched between requests.
+        """
+        if self.prompt_caching and self.model.startswith("anthropic/"):
+            return {"anthropic-beta": "prompt-caching-2024-07-31"}
+        return {}
+
+    def _payload(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """Build the JSON body of a chat completion request."""
+        if self.prompt_caching:
+            messages = [_mark_cacheable(message) for message in messages]
+        # The model is read on each call, so that it can be switched between calls
+        return {
             "model": self.model,
             "messages": messages,
             "temperature": temperature,
@@ -101,13 +560,75 @@ class OpenRouterProvider(LLMProvider):
             **kwargs,
         }
 
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30,
-        )
-        response.raise_for_status()
+    def _cache_keys(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        **kwargs: Any,
+    ) -> tuple[Optional[str], Optional[tuple[str, str]]]:
+        """
+        Compute the cache lookup keys of a request.
 
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        Returns:
+            The exact-match cache key and the semantic cache query, each None
+            when the corresponding cache does not apply. The semantic query is
+            a (partition, text) pair: only the last message is compared by
+            similarity, the rest of the request must match exactly.
+        """
+        # Only deterministic requests are cached, sampling must stay random
+        if temperature != 0.0:
+            return None, None
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs,
+            )
+
+        semantic_query = None
+        if self.semantic_cache is not None and messages:
+            content = messages[-1].get("content")
+            if isinstance(content, str):
+                # Identical last messages ("Tool result: 4") may close
+                # unrelated conversations, so partition by everything else
+                partition = make_cache_key(
+                    model=self.model,
+                    messages=messages[:-1],
+                    role=messages[-1].get("role"),
+                    max_tokens=max_tokens,
+                    **kwargs,
+                )
+                semantic_query = (partition, content)
+
+        return cache_key, semantic_query
+
+    def _cache_get(
+        self, cache_key: Optional[str], semantic_query: Optional[tuple[str, str]]
+    ) -> Optional[str]:
+        """Look up a response in the exact-match then the semantic cache."""
+        if cache_key is not None:
+            cached = self.cache.get(cache_key, ttl=self.ttl)
+            if cached is not None:
+                return cached
+        if semantic_query is not None:
+            partition, text = semantic_query
+            return self.semantic_cache.lookup(text, partition=partition)
+        return None
+
+    def _cache_set(
+        self,
+        cache_key: Optional[str],
+        semantic_query: Optional[tuple[str, str]],
+        content: str,
+    ) -> None:
+        """Store a generated response in the applicable caches."""
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        if semantic_query is not None:
+            partition, text = semantic_query
+            self.semantic_cache.add(text, content, partition=partition)
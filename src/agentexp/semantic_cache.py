@@ -0,0 +1,120 @@
+"""
+Semantic response cache for LLM providers.
+
+Paraphrased requests ("What is 15*23+47?" vs "Compute 15 times 23 plus 47")
+miss an exact-match cache even though they lead to the same answer. The
+semantic cache embeds the request text and replays the response of the most
+similar cached request when their cosine similarity exceeds a threshold.
+Entries are grouped in partitions (e.g. one per conversation prefix and
+model), and a lookup only considers the entries of its own partition.
+
+This module needs the optional ``faiss-cpu`` and ``sentence-transformers``
+packages (``pip install agentexp[semantic]``).
+"""
+
+import threading
+from typing import Any, Callable, Optional
+
+try:
+    import faiss
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    faiss = None
+    np = None
+
+
+class SemanticCache:
+    """
+    A similarity-based response cache.
+
+    Request texts are embedded, L2-normalized and stored in a FAISS
+    inner-product index, so that the index search returns cosine similarities.
+    Each partition has its own index.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        model_name: str = "all-MiniLM-L6-v2",
+        embedder: Optional[Callable[[str], Any]] = None,
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            model_name: sentence-transformers model used to embed texts
+            embedder: Optional function mapping a text to an embedding vector.
+                If None, a sentence-transformers model is loaded.
+
+        Raises:
+            ImportError: If the optional dependencies are not installed
+        """
+        if faiss is None:
+            raise ImportError(
+                "SemanticCache requires faiss-cpu and numpy. "
+                "Install them with: pip install agentexp[semantic]"
+            )
+        if embedder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "SemanticCache requires sentence-transformers to embed texts. "
+                    "Install it with: pip install agentexp[semantic]"
+                ) from e
+            embedder = SentenceTransformer(model_name).encode
+
+        self.threshold = threshold
+        self._embedder = embedder
+        # Partition -> (index, responses in index order)
+        self._partitions: dict[str, tuple[Any, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(responses) for _, responses in self._partitions.values())
+
+    def _embed(self, text: str) -> Any:
+        """Embed a text as a normalized float32 row vector."""
+        vector = np.asarray(self._embedder(text), dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, text: str, partition: str = "") -> Optional[str]:
+        """
+        Find the response of the most similar cached request.
+
+        Args:
+            text: The request text
+            partition: Only entries added to this partition are considered
+
+        Returns:
+            The cached response, or None if no entry is similar enough
+        """
+        if partition not in self._partitions:
+            return None
+        query = self._embed(text)
+        with self._lock:
+            index, responses = self._partitions[partition]
+            scores, ids = index.search(query, 1)
+            if ids[0][0] < 0 or scores[0][0] < self.threshold:
+                return None
+            return responses[ids[0][0]]
+
+    def add(self, text: str, response: str, partition: str = "") -> None:
+        """
+        Store the response to a request.
+
+        Args:
+            text: The request text
+            response: The response text to cache
+            partition: The partition to store the entry in
+        """
+        vector = self._embed(text)
+        with self._lock:
+            if partition not in self._partitions:
+                index = faiss.IndexFlatIP(vector.shape[1])
+                self._partitions[partition] = (index, [])
+            index, responses = self._partitions[partition]
+            index.add(vector)
+            responses.append(response)
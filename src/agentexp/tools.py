@@ -5,9 +5,46 @@ Tools are the building blocks that allow agents to interact with the world.
 Each tool represents a specific capability (e.g., math operations, web search).
 """
 
+import inspect
+import typing
 from abc import ABC, abstractmethod
 from typing import Any
 
+# JSON schema types of the Python annotations supported in tool signatures
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+
+def _json_schema_type(annotation: Any) -> dict[str, Any]:
+    """Map a type annotation to a JSON schema, empty if it has no equivalent."""
+    origin = typing.get_origin(annotation)
+    # Function-calling validators (e.g. Gemini's) require the item schema
+    if annotation is list or origin is list:
+        args = typing.get_args(annotation)
+        return {"type": "array", "items": _json_schema_type(args[0]) if args else {}}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    if origin in _JSON_TYPES:
+        return {"type": _JSON_TYPES[origin]}
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return _json_schema_type(args[0])
+        types = {_JSON_TYPES.get(arg) for arg in args}
+        types.discard(None)
+        # int is a subset of number, so Union[float, int] is a number
+        if types == {"integer", "number"}:
+            return {"type": "number"}
+        if len(types) == 1:
+            return {"type": types.pop()}
+    return {}
+
 
 class Tool(ABC):
     """
@@ -42,5 +79,41 @@ class Tool(ABC):
         """
         pass
 
+    @property
+    def parameters(self) -> dict[str, Any]:
+        """
+        Return the JSON schema of the tool arguments.
+
+        Used by LLM providers with native function calling. The default
+        implementation infers it from the signature of :meth:`execute`;
+        override it to give a more precise schema.
+        """
+        signature = inspect.signature(self.execute)
+        try:
+            hints = typing.get_type_hints(self.execute)
+        except Exception:
+            hints = {}
+
+        properties = {}
+        required = []
+        for name, param in signature.parameters.items():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            properties[name] = _json_schema_type(hints.get(name, Any))
+            if param.default is param.empty:
+                required.append(name)
+        return {"type": "object", "properties": properties, "required": required}
+
+    def to_function_schema(self) -> dict[str, Any]:
+        """Return the tool description in the function-calling format."""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(name='{self.name}')"
@@ -0,0 +1,53 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+from agentexp.calculator_tools import (
+    CalculatorTool,
+    MathFunctionBatchTool,
+    MathFunctionTool,
+    VerifyCalculationTool,
+)
+
+
+@pytest.fixture(autouse=True)
+def _block_network(request, monkeypatch):
+    """Fail any HTTP request a test did not mock, unless marked ``network``."""
+    if request.node.get_closest_marker("network"):
+        return
+
+    def fail(*args, **kwargs):
+        pytest.fail("Unmocked network call")
+
+    # Every requests call (requests.post or a Session) goes through an adapter
+    monkeypatch.setattr("requests.adapters.HTTPAdapter.send", fail)
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover - optional dependency
+        return
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", fail)
+
+
+@pytest.fixture(scope="module")
+def calculator_tool():
+    """A CalculatorTool shared by the tests of a module (the tool is stateless)."""
+    return CalculatorTool()
+
+
+@pytest.fixture(scope="module")
+def math_function_tool():
+    """A MathFunctionTool shared by the tests of a module."""
+    return MathFunctionTool()
+
+
+@pytest.fixture(scope="module")
+def math_function_batch_tool():
+    """A MathFunctionBatchTool shared by the tests of a module."""
+    pytest.importorskip("numpy")
+    return MathFunctionBatchTool()
+
+
+@pytest.fixture(scope="module")
+def verify_calculation_tool():
+    """A VerifyCalculationTool shared by the tests of a module."""
+    return VerifyCalculationTool()
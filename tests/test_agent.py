@@ -1,8 +1,12 @@
 """Tests for core agent functionality."""
 
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
-from agentexp.agent import Agent
+from agentexp.agent import _MAX_TOOL_WORKERS, Agent, _RateLimiter
 from agentexp.llm import LLMProvider
 from agentexp.tools import Tool
 
@@ -14,9 +18,13 @@ class MockLLMProvider(LLMProvider):
         """Initialize with a list of responses to return."""
         self.responses = responses
         self.call_count = 0
+        self.received = []
+        self.received_kwargs = []
 
     def generate(self, messages, **kwargs):
         """Return the next response in the list."""
+        self.received.append(list(messages))
+        self.received_kwargs.append(kwargs)
         if self.call_count >= len(self.responses):
             raise RuntimeError("No more mock responses")
         response = self.responses[self.call_count]
@@ -24,6 +32,25 @@ class MockLLMProvider(LLMProvider):
         return response
 
 
+class MockFunctionCallingProvider(LLMProvider):
+    """Mock LLM provider with native function calling."""
+
+    supports_function_calling = True
+
+    def __init__(self, messages):
+        """Initialize with a list of assistant messages to return."""
+        self.messages = messages
+        self.received = []
+
+    def generate(self, messages, **kwargs):
+        raise AssertionError("generate should not be used with function calling")
+
+    def generate_with_tools(self, messages, tools, **kwargs):
+        """Return the next assistant message in the list."""
+        self.received.append((list(messages), tools))
+        return self.messages[len(self.received) - 1]
+
+
 class MockTool(Tool):
     """Mock tool for testing."""
 
@@ -91,9 +118,8 @@ class TestAgent:
         tools = [MockTool()]
         agent = Agent(llm, tools, max_iterations=5)
 
-        with pytest.raises(RuntimeError) as exc_info:
+        with pytest.raises(RuntimeError, match="Max iterations"):
             agent.run("Do something")
-        assert "Max iterations" in str(exc_info.value)
 
     def test_agent_unknown_tool(self):
         """Test agent handles unknown tool gracefully."""
@@ -139,3 +165,453 @@ class TestAgent:
 
         result = agent.run("Do something")
         assert result == "Recovered"
+
+    def test_agent_batched_tools(self):
+        """Test agent executes a batch of tool calls in one iteration."""
+        add = MockTool(name="add", result=3)
+        mul = MockTool(name="mul", result=6)
+        responses = [
+            '{"tools": [{"tool": "add", "arguments": {"a": 1, "b": 2}}, '
+            '{"tool": "mul", "arguments": {"a": 2, "b": 3}}]}',
+            '{"final_answer": "9"}',
+        ]
+        llm = MockLLMProvider(responses)
+        agent = Agent(llm, [add, mul])
+
+        result = agent.run("Add and multiply")
+        assert result == "9"
+        assert add.last_args == {"a": 1, "b": 2}
+        assert mul.last_args == {"a": 2, "b": 3}
+        assert llm.call_count == 2
+
+    def test_agent_batched_tools_observation(self):
+        """Test batch results are aggregated into a single message."""
+        agent = Agent(MockLLMProvider([]), [MockTool(result="ok")])
+        message = agent._execute_tool_calls(
+            [
+                {"tool": "mock_tool", "arguments": {}},
+                {"tool": "unknown_tool", "arguments": {}},
+                {"tool": ["x"], "arguments": {}},
+            ]
+        )
+        assert message.startswith("Tool results: ")
+        assert json.loads(message[len("Tool results: ") :]) == [
+            {"name": "mock_tool", "result": "ok"},
+            {"name": "unknown_tool", "result": "Unknown tool: unknown_tool"},
+            {"name": ["x"], "result": "Unknown tool: ['x']"},
+        ]
+
+    def test_agent_batched_tools_large_ints(self):
+        """Test results that JSON encoders reject are reported as strings."""
+        tools = [
+            MockTool(name="small", result=[2**62, 1.5, True]),
+            MockTool(name="big", result=2**70),
+            MockTool(name="huge", result=2**20000),
+            MockTool(name="other", result={1: {"x"}}),
+        ]
+        agent = Agent(MockLLMProvider([]), tools)
+        message = agent._execute_tool_calls(
+            [{"tool": tool.name, "arguments": {}} for tool in tools]
+        )
+        assert json.loads(message[len("Tool results: ") :]) == [
+            {"name": "small", "result": [2**62, 1.5, True]},
+            {"name": "big", "result": str(2**70)},
+            {"name": "huge", "result": "3.980277e+6020"},
+            {"name": "other", "result": {"1": "{'x'}"}},
+        ]
+
+    @pytest.mark.parametrize(
+        "response",
+        ['{"tool": ["x"]}', '{"tools": [{"tool": ["x"]}]}'],
+    )
+    def test_agent_unhashable_tool_name(self, response):
+        """Test an unhashable tool name is reported back instead of raising."""
+        llm = MockLLMProvider([response, '{"final_answer": "done"}'])
+        agent = Agent(llm, [MockTool()])
+
+        assert agent.run("Do something") == "done"
+        assert "Unknown tool: ['x']" in llm.received[-1][-1]["content"]
+
+    def test_batched_tools_worker_cap(self, monkeypatch):
+        """Test a large batch does not start one thread per call."""
+        workers = []
+
+        def executor(max_workers):
+            workers.append(max_workers)
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        monkeypatch.setattr("agentexp.agent.ThreadPoolExecutor", executor)
+        agent = Agent(MockLLMProvider([]), [MockTool(result="ok")])
+        results = agent._run_tool_calls([{"tool": "mock_tool"}] * 50)
+        assert results == ["ok"] * 50
+        assert workers == [_MAX_TOOL_WORKERS]
+
+    def test_system_prompt_advertises_batches(self):
+        """Test the system prompt documents the batched tool call format."""
+        agent = Agent(MockLLMProvider([]), [MockTool()])
+        assert '{"tools": [' in agent._create_system_prompt()
+
+    def test_agent_arun(self):
+        """Test agent can complete a task asynchronously."""
+        tool = MockTool(result="tool output")
+        responses = [
+            '{"tool": "mock_tool", "arguments": {"param": "value"}}',
+            '{"final_answer": "Task complete"}',
+        ]
+        agent = Agent(MockLLMProvider(responses), [tool])
+
+        result = asyncio.run(agent.arun("Do something"))
+        assert result == "Task complete"
+        assert tool.last_args == {"param": "value"}
+
+    def test_agent_run_batch_async(self):
+        """Test agent runs several tasks concurrently."""
+        responses = ['{"final_answer": "done"}'] * 3
+        agent = Agent(MockLLMProvider(responses), [MockTool()])
+
+        results = asyncio.run(agent.run_batch_async(["a", "b", "c"]))
+        assert results == ["done", "done", "done"]
+
+    @pytest.mark.parametrize("early_exit_json", [False, True])
+    def test_agent_early_exit_json(self, early_exit_json):
+        """Test the early-exit opt-in is forwarded to the provider."""
+        llm = MockLLMProvider(['{"final_answer": "42"}'])
+        agent = Agent(llm, [MockTool()], early_exit_json=early_exit_json)
+
+        assert agent.run("Do something") == "42"
+        expected = {"early_exit_json": True} if early_exit_json else {}
+        assert llm.received_kwargs == [expected]
+
+    @pytest.mark.parametrize("arguments", ['{"param": "value"}', {"param": "value"}])
+    def test_agent_function_calling(self, arguments):
+        """Test agent uses native tool calls when the provider supports them."""
+        tool = MockTool(result="tool output")
+        llm = MockFunctionCallingProvider(
+            [
+                {
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": "call_1",
+                            "type": "function",
+                            "function": {
+                                "name": "mock_tool",
+                                "arguments": arguments,
+                            },
+                        }
+                    ],
+                },
+                {"content": "Task complete"},
+            ]
+        )
+        agent = Agent(llm, [tool])
+
+        result = agent.run("Do something")
+        assert result == "Task complete"
+        assert tool.last_args == {"param": "value"}
+
+        messages, tools = llm.received[1]
+        assert tools[0]["function"]["name"] == "mock_tool"
+        assert messages[-1] == {
+            "role": "tool",
+            "tool_call_id": "call_1",
+            "content": "tool output",
+        }
+
+    @pytest.mark.parametrize(
+        "response",
+        [
+            '{"final_answer": "42"}',
+            'Sure! {"final_answer": "42"}',
+            '{"final_answer": "42"} Let me know if you need anything {else}.',
+            'Using {braces} first, then {"final_answer": "42"}',
+        ],
+    )
+    def test_parse_action(self, response):
+        """Test the first complete JSON object is extracted from the response."""
+        agent = Agent(MockLLMProvider([]), [MockTool()])
+        assert agent._parse_action(response) == {"final_answer": "42"}
+
+    @pytest.mark.parametrize("response", ["No JSON here", '"just a string"', "{oops"])
+    def test_parse_action_invalid(self, response):
+        """Test responses without a JSON object raise JSONDecodeError."""
+        agent = Agent(MockLLMProvider([]), [MockTool()])
+        with pytest.raises(json.JSONDecodeError):
+            agent._parse_action(response)
+
+    def test_system_prompt_built_once(self):
+        """Test the system prompt is computed at initialization and reused."""
+        agent = Agent(MockLLMProvider([]), [MockTool(description="Does mocking")])
+        prompt = agent._create_system_prompt()
+        assert "- mock_tool: Does mocking" in prompt
+        assert agent._create_system_prompt() is prompt
+
+    def test_agent_run_batch(self):
+        """Test run_batch reports progress and keeps the task order."""
+        responses = ['{"final_answer": "done"}'] * 4
+        agent = Agent(MockLLMProvider(responses), [MockTool()])
+        progress = []
+
+        results = agent.run_batch(
+            ["a", "b", "c", "d"],
+            max_concurrency=2,
+            rate_limit_rpm=60000,
+            on_progress=lambda done, total: progress.append((done, total)),
+        )
+        assert results == ["done"] * 4
+        assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+    def test_agent_run_batch_closes_async_client(self):
+        """Test run_batch closes the provider's client before its loop ends."""
+        llm = MockLLMProvider(['{"final_answer": "done"}'] * 2)
+        closed_in = []
+
+        async def aclose():
+            closed_in.append(asyncio.get_running_loop())
+
+        llm.aclose = aclose
+        agent = Agent(llm, [MockTool()])
+        assert agent.run_batch(["a", "b"]) == ["done"] * 2
+        assert len(closed_in) == 1
+        assert closed_in[0].is_closed()
+
+    @pytest.mark.parametrize("return_exceptions", [False, True])
+    def test_agent_run_batch_failed_task(self, return_exceptions):
+        """Test a failed task does not discard the answers of the others."""
+
+        class FailingProvider(MockLLMProvider):
+            def generate(self, messages, **kwargs):
+                if messages[-1]["content"] == "b":
+                    raise RuntimeError("API down")
+                return super().generate(messages, **kwargs)
+
+        llm = FailingProvider(['{"final_answer": "done"}'] * 2)
+        agent = Agent(llm, [MockTool()])
+        progress = []
+
+        def run_batch():
+            return agent.run_batch(
+                ["a", "b", "c"],
+                on_progress=lambda done, total: progress.append(done),
+                return_exceptions=return_exceptions,
+            )
+
+        if return_exceptions:
+            batch = run_batch()
+            assert batch[0] == batch[2] == "done"
+            assert isinstance(batch[1], RuntimeError)
+        else:
+            with pytest.raises(RuntimeError, match="API down"):
+                run_batch()
+        # The other tasks ran to completion either way
+        assert llm.call_count == 2
+        assert progress == [1, 2, 3]
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"max_concurrency": 0},
+            {"max_concurrency": -1},
+            {"rate_limit_rpm": 0},
+            {"rate_limit_rpm": -60},
+        ],
+    )
+    def test_agent_run_batch_invalid_limits(self, kwargs):
+        """Test limits that would hang or misbehave are rejected."""
+        llm = MockLLMProvider(['{"final_answer": "done"}'])
+        agent = Agent(llm, [MockTool()])
+
+        with pytest.raises(ValueError, match="must be positive"):
+            agent.run_batch(["a"], **kwargs)
+        assert llm.call_count == 0
+
+    def test_agent_run_batch_function_calling_rate_limited(self, monkeypatch):
+        """Test every function-calling request waits for the rate limiter."""
+        acquired = []
+
+        async def acquire(limiter):
+            acquired.append(limiter)
+
+        monkeypatch.setattr(_RateLimiter, "acquire", acquire)
+        llm = MockFunctionCallingProvider(
+            [
+                {
+                    "content": None,
+                    "tool_calls": [{"id": "call_1", "function": {"name": "mock_tool"}}],
+                },
+                {"content": "Task complete"},
+            ]
+        )
+        agent = Agent(llm, [MockTool()])
+
+        assert agent.run_batch(["a"], rate_limit_rpm=60) == ["Task complete"]
+        assert len(acquired) == 2
+
+    def test_rate_limiter_spacing(self):
+        """Test the rate limiter releases requests one interval apart."""
+
+        async def acquire_times():
+            limiter = _RateLimiter(requests_per_minute=3000)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            times = []
+            for _ in range(3):
+                await limiter.acquire()
+                times.append(loop.time() - start)
+            return times
+
+        # Slots are reserved from the first request, so measure from the start
+        # rather than between returns, whose delays vary with the machine load
+        times = asyncio.run(acquire_times())
+        assert times[1] >= 0.019
+        assert times[2] >= 0.039
+
+    @pytest.mark.parametrize(
+        "task,expected",
+        [
+            ("What is 15*23+47?", "392"),
+            ("calculate (2 + 3) * 4", "20"),
+            ("2^10", "1024"),
+            ("2**10 * 3 - 2**-1", "3071.5"),
+        ],
+    )
+    def test_agent_fast_path(self, task, expected):
+        """Test pure arithmetic tasks are answered without the LLM."""
+        llm = MockLLMProvider([])
+        agent = Agent(llm, [MockTool()])
+
+        assert agent.run(task, fast_path=True) == expected
+        assert llm.call_count == 0
+
+    @pytest.mark.parametrize(
+        "task",
+        [
+            "What is the square root of 144?",
+            "What is ?",
+            "What is 2**20000?",
+            "9**9**9",
+            "99999^999",
+            "(2**1000)**1000",
+            "2**(1000+1)",
+            "10.0**400",
+        ],
+    )
+    def test_agent_fast_path_falls_back(self, task):
+        """Test other tasks still go through the LLM."""
+        llm = MockLLMProvider(['{"final_answer": "from llm"}'])
+        agent = Agent(llm, [MockTool()])
+
+        assert agent.run(task, fast_path=True) == "from llm"
+        assert llm.call_count == 1
+
+    def test_agent_fast_path_disabled_by_default(self):
+        """Test the fast path is opt-in."""
+        llm = MockLLMProvider(['{"final_answer": "from llm"}'])
+        agent = Agent(llm, [MockTool()])
+
+        assert agent.run("What is 2 + 2?") == "from llm"
+
+    def test_agent_history_window(self):
+        """Test old steps are dropped from the requests sent to the LLM."""
+        responses = ['{"tool": "mock_tool", "arguments": {}}'] * 5
+        responses.append('{"final_answer": "done"}')
+        llm = MockLLMProvider(responses)
+        agent = Agent(llm, [MockTool()], history_window=2)
+
+        assert agent.run("Do something") == "done"
+        last_request = llm.received[-1]
+        assert len(last_request) == 2 + 2 * 2
+        assert last_request[1] == {"role": "user", "content": "Do something"}
+        assert last_request[2]["role"] == "assistant"
+
+    def test_agent_history_unbounded(self):
+        """Test history_window=None keeps every step."""
+        responses = ['{"tool": "mock_tool", "arguments": {}}'] * 5
+        responses.append('{"final_answer": "done"}')
+        llm = MockLLMProvider(responses)
+        agent = Agent(llm, [MockTool()], history_window=None)
+
+        agent.run("Do something")
+        assert len(llm.received[-1]) == 2 + 2 * 5
+
+    def test_agent_history_summary(self):
+        """Test dropped steps are replaced by an LLM summary."""
+        agent = Agent(MockLLMProvider(["steps 1 and 2"]), [MockTool()])
+        agent.history_window = 1
+        agent.summarize = True
+        messages = [
+            {"role": "system", "content": "system"},
+            {"role": "user", "content": "task"},
+        ]
+        for step in range(3):
+            messages.append({"role": "assistant", "content": f"action {step}"})
+            messages.append({"role": "user", "content": f"result {step}"})
+
+        agent._trim_history(messages)
+        assert [message["content"] for message in messages] == [
+            "system",
+            "task",
+            "[Summary of previous steps]: steps 1 and 2",
+            "action 2",
+            "result 2",
+        ]
+
+    def test_agent_history_summary_calls(self):
+        """Test a summary is requested once per history_window steps."""
+
+        class SummarizingProvider(MockLLMProvider):
+            summaries = 0
+
+            def generate(self, messages, **kwargs):
+                if messages[0]["content"].startswith("Summarize"):
+                    self.summaries += 1
+                    return f"summary {self.summaries}"
+                return super().generate(messages, **kwargs)
+
+        responses = ['{"tool": "mock_tool", "arguments": {}}'] * 9
+        responses.append('{"final_answer": "done"}')
+        llm = SummarizingProvider(responses)
+        agent = Agent(llm, [MockTool()], history_window=2, summarize=True)
+
+        assert agent.run("Do something") == "done"
+        assert llm.summaries == 3
+        last_request = llm.received[-1]
+        assert last_request[2]["content"].endswith("summary 3")
+        assert len(last_request) == 3 + 2 * 3
+
+    def test_agent_history_summary_async(self, monkeypatch):
+        """Test asynchronous runs summarize through agenerate and the limiter."""
+
+        class AsyncProvider(MockLLMProvider):
+            def generate(self, messages, **kwargs):
+                raise AssertionError("generate would block the event loop")
+
+            async def agenerate(self, messages, **kwargs):
+                return super().generate(messages, **kwargs)
+
+        acquired = []
+
+        async def acquire(limiter):
+            acquired.append(limiter)
+
+        monkeypatch.setattr(_RateLimiter, "acquire", acquire)
+        agent = Agent(AsyncProvider(["steps 1 and 2"]), [MockTool()])
+        agent.history_window = 1
+        agent.summarize = True
+        messages = [
+            {"role": "system", "content": "system"},
+            {"role": "user", "content": "task"},
+        ]
+        for step in range(3):
+            messages.append({"role": "assistant", "content": f"action {step}"})
+            messages.append({"role": "user", "content": f"result {step}"})
+
+        asyncio.run(agent._atrim_history(messages, _RateLimiter(60)))
+        assert [message["content"] for message in messages] == [
+            "system",
+            "task",
+            "[Summary of previous steps]: steps 1 and 2",
+            "action 2",
+            "result 2",
+        ]
+        assert len(acquired) == 1
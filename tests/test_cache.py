@@ -0,0 +1,84 @@
+"""Tests for response caches."""
+
+from unittest.mock import patch
+
+import pytest
+
+from agentexp.cache import InMemoryCache, SQLiteCache, make_cache_key
+
+
+class TestMakeCacheKey:
+    """Test the make_cache_key function."""
+
+    def test_deterministic(self):
+        """Test identical requests produce identical keys."""
+        messages = [{"role": "user", "content": "Hello"}]
+        key1 = make_cache_key(model="m", messages=messages, temperature=0.0)
+        key2 = make_cache_key(temperature=0.0, messages=messages, model="m")
+        assert key1 == key2
+
+    def test_different_requests(self):
+        """Test different requests produce different keys."""
+        messages = [{"role": "user", "content": "Hello"}]
+        key1 = make_cache_key(model="m", messages=messages)
+        key2 = make_cache_key(model="other", messages=messages)
+        assert key1 != key2
+
+
+@pytest.mark.parametrize("cache_factory", [InMemoryCache, SQLiteCache])
+class TestResponseCaches:
+    """Test behavior shared by all cache backends."""
+
+    def test_miss(self, cache_factory):
+        """Test a missing key returns None."""
+        assert cache_factory().get("missing") is None
+
+    def test_set_and_get(self, cache_factory):
+        """Test a stored response can be retrieved."""
+        cache = cache_factory()
+        cache.set("key", "response")
+        assert cache.get("key") == "response"
+
+    def test_overwrite(self, cache_factory):
+        """Test storing a key twice keeps the latest response."""
+        cache = cache_factory()
+        cache.set("key", "old")
+        cache.set("key", "new")
+        assert cache.get("key") == "new"
+
+    def test_ttl_expiry(self, cache_factory):
+        """Test entries older than the TTL are treated as missing."""
+        cache = cache_factory()
+        with patch("agentexp.cache.time.time", return_value=1000.0):
+            cache.set("key", "response")
+        with patch("agentexp.cache.time.time", return_value=1100.0):
+            assert cache.get("key", ttl=200) == "response"
+            assert cache.get("key", ttl=50) is None
+
+
+class TestInMemoryCache:
+    """Test the InMemoryCache class."""
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted."""
+        cache = InMemoryCache(maxsize=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        assert cache.get("a") == "1"
+        assert cache.get("b") is None
+        assert cache.get("c") == "3"
+
+
+class TestSQLiteCache:
+    """Test the SQLiteCache class."""
+
+    def test_persistence(self, tmp_path):
+        """Test responses persist across cache instances."""
+        path = str(tmp_path / "cache.db")
+        cache = SQLiteCache(path)
+        cache.set("key", "response")
+        cache.close()
+
+        assert SQLiteCache(path).get("key") == "response"
@@ -1,140 +1,334 @@
 """Tests for calculator tools."""
 
+import copy
 import math
+import subprocess
+import sys
 
 import pytest
 
 from agentexp.calculator_tools import (
     CalculatorTool,
     MathFunctionTool,
-    VerifyCalculationTool,
+    _compile_expression,
+    _try_compile_expression,
 )
 
 
-class TestCalculatorTool:
-    """Test the CalculatorTool class."""
-
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.tool = CalculatorTool()
-
-    def test_name(self):
-        """Test tool name."""
-        assert self.tool.name == "calculator"
-
-    def test_description(self):
-        """Test tool has a description."""
-        assert len(self.tool.description) > 0
-        assert "expression" in self.tool.description.lower()
-
-    def test_basic_operations(self):
-        """Test basic arithmetic operations."""
-        assert self.tool.execute("2 + 2") == 4
-        assert self.tool.execute("10 - 3") == 7
-        assert self.tool.execute("5 * 4") == 20
-        assert self.tool.execute("15 / 3") == 5
-        assert self.tool.execute("2 ** 3") == 8
-
-    def test_complex_expression(self):
-        """Test complex mathematical expressions."""
-        assert self.tool.execute("(2 + 3) * 4") == 20
-        assert self.tool.execute("2 + 3 * 4") == 14
-        assert self.tool.execute("(10 - 2) / 4") == 2
-
-    def test_invalid_expression(self):
-        """Test that invalid expressions raise ValueError."""
-        with pytest.raises(ValueError):
-            self.tool.execute("import os")
-
-        with pytest.raises(ValueError):
-            self.tool.execute("2 +")
-
-
-class TestMathFunctionTool:
-    """Test the MathFunctionTool class."""
-
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.tool = MathFunctionTool()
-
-    def test_name(self):
-        """Test tool name."""
-        assert self.tool.name == "math_function"
-
-    def test_description(self):
-        """Test tool has a description."""
-        assert len(self.tool.description) > 0
-        assert "function" in self.tool.description.lower()
-
-    def test_sqrt(self):
-        """Test square root function."""
-        assert self.tool.execute("sqrt", 16) == 4.0
-        assert self.tool.execute("sqrt", 25) == 5.0
-
-    def test_trigonometric(self):
-        """Test trigonometric functions."""
-        assert abs(self.tool.execute("sin", 0) - 0.0) < 1e-9
-        assert abs(self.tool.execute("cos", 0) - 1.0) < 1e-9
-        assert abs(self.tool.execute("tan", 0) - 0.0) < 1e-9
-
-    def test_logarithmic(self):
-        """Test logarithmic functions."""
-        assert abs(self.tool.execute("log", math.e) - 1.0) < 1e-9
-        assert abs(self.tool.execute("log10", 100) - 2.0) < 1e-9
-
-    def test_floor_ceil(self):
-        """Test floor and ceil functions."""
-        assert self.tool.execute("floor", 3.7) == 3
-        assert self.tool.execute("ceil", 3.2) == 4
-
-    def test_factorial(self):
-        """Test factorial function."""
-        assert self.tool.execute("factorial", 5) == 120
-        assert self.tool.execute("factorial", 0) == 1
-
-    def test_unknown_function(self):
-        """Test that unknown functions raise ValueError."""
-        with pytest.raises(ValueError) as exc_info:
-            self.tool.execute("unknown_func", 5)
-        assert "Unknown function" in str(exc_info.value)
-
-    def test_invalid_input(self):
-        """Test that invalid inputs raise ValueError."""
-        with pytest.raises(ValueError):
-            self.tool.execute("sqrt", -1)
-
-
-class TestVerifyCalculationTool:
-    """Test the VerifyCalculationTool class."""
-
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.tool = VerifyCalculationTool()
-
-    def test_name(self):
-        """Test tool name."""
-        assert self.tool.name == "verify_calculation"
-
-    def test_description(self):
-        """Test tool has a description."""
-        assert len(self.tool.description) > 0
-
-    def test_correct_calculation(self):
-        """Test verification of correct calculations."""
-        assert self.tool.execute("2 + 2", 4) is True
-        assert self.tool.execute("5 * 3", 15) is True
-        assert self.tool.execute("10 / 2", 5) is True
-
-    def test_incorrect_calculation(self):
-        """Test verification of incorrect calculations."""
-        assert self.tool.execute("2 + 2", 5) is False
-        assert self.tool.execute("5 * 3", 14) is False
-
-    def test_floating_point(self):
-        """Test verification with floating point numbers."""
-        assert self.tool.execute("1 / 3 * 3", 1.0) is True
-        assert self.tool.execute("0.1 + 0.2", 0.3) is True
-
-    def test_invalid_expression(self):
-        """Test that invalid expressions return False."""
-        assert self.tool.execute("invalid", 0) is False
+# CalculatorTool
+def test_calculator_name(calculator_tool):
+    """Test tool name."""
+    assert calculator_tool.name == "calculator"
+
+
+def test_calculator_description(calculator_tool):
+    """Test tool has a description."""
+    assert len(calculator_tool.description) > 0
+    assert "expression" in calculator_tool.description.lower()
+
+
+@pytest.mark.parametrize(
+    "expression,expected",
+    [("2 + 2", 4), ("10 - 3", 7), ("5 * 4", 20), ("15 / 3", 5), ("2 ** 3", 8)],
+)
+def test_calculator_basic_operations(calculator_tool, expression, expected):
+    """Test basic arithmetic operations."""
+    assert calculator_tool.execute(expression) == expected
+
+
+@pytest.mark.parametrize(
+    "expression,expected",
+    [("(2 + 3) * 4", 20), ("2 + 3 * 4", 14), ("(10 - 2) / 4", 2)],
+)
+def test_calculator_complex_expression(calculator_tool, expression, expected):
+    """Test complex mathematical expressions."""
+    assert calculator_tool.execute(expression) == expected
+
+
+def test_calculator_invalid_expression(calculator_tool):
+    """Test that invalid expressions raise ValueError."""
+    with pytest.raises(ValueError):
+        calculator_tool.execute("import os")
+
+    with pytest.raises(ValueError):
+        calculator_tool.execute("2 +")
+
+
+def test_calculator_results_memoized(calculator_tool):
+    """Test repeated expressions are served from the result cache."""
+    calculator_tool.execute("123 * 456")
+    hits = CalculatorTool._eval_cached.cache_info().hits
+    assert calculator_tool.execute("123 * 456") == 56088
+    assert CalculatorTool._eval_cached.cache_info().hits == hits + 1
+
+
+@pytest.mark.parametrize("expression", ["[1, 2]", "max([1, 2], [0])", "([1], 2)"])
+def test_calculator_cached_results_not_shared(calculator_tool, expression):
+    """Test mutating a returned container does not alter later results."""
+    first = calculator_tool.execute(expression)
+    expected = copy.deepcopy(first)
+    (first if isinstance(first, list) else first[0]).append(3)
+    assert calculator_tool.execute(expression) == expected
+
+
+def test_calculator_memoized_per_namespace():
+    """Test a subclass with its own namespace does not reuse cached results."""
+
+    class NegatingCalculator(CalculatorTool):
+        _NAMESPACE = {**CalculatorTool._NAMESPACE, "abs": lambda x: -abs(x)}
+
+    assert CalculatorTool().execute("abs(-7)") == 7
+    assert NegatingCalculator().execute("abs(-7)") == -7
+
+
+def test_calculator_expressions_compiled_once():
+    """Test repeated expressions reuse the cached compiled code."""
+    code = _compile_expression("7 * 6")
+    hits = _compile_expression.cache_info().hits
+    assert _compile_expression("7 * 6") is code
+    assert _compile_expression.cache_info().hits == hits + 1
+
+
+def test_calculator_functions(calculator_tool):
+    """Test calls to the allowed functions."""
+    assert calculator_tool.execute("abs(-3) + max(1, 2)") == 5
+    assert calculator_tool.execute("round(2.567, ndigits=2)") == 2.57
+    assert calculator_tool.execute("sum([1, 2, 3])") == 6
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "__import__('os')",
+        "(1).__class__",
+        "'a' * 3",
+        "[x for x in (1, 2)]",
+        "lambda: 1",
+    ],
+)
+def test_calculator_unsafe_expression(calculator_tool, expression):
+    """Test that expressions outside the whitelist raise ValueError."""
+    with pytest.raises(ValueError):
+        calculator_tool.execute(expression)
+
+
+# MathFunctionTool
+def test_math_function_name(math_function_tool):
+    """Test tool name."""
+    assert math_function_tool.name == "math_function"
+
+
+def test_math_function_description(math_function_tool):
+    """Test tool has a description."""
+    assert len(math_function_tool.description) > 0
+    assert "function" in math_function_tool.description.lower()
+
+
+@pytest.mark.parametrize("value,expected", [(16, 4.0), (25, 5.0)])
+def test_math_function_sqrt(math_function_tool, value, expected):
+    """Test square root function."""
+    assert math_function_tool.execute("sqrt", value) == expected
+
+
+@pytest.mark.parametrize(
+    "function,value,expected", [("sin", 0, 0.0), ("cos", 0, 1.0), ("tan", 0, 0.0)]
+)
+def test_math_function_trigonometric(math_function_tool, function, value, expected):
+    """Test trigonometric functions."""
+    result = math_function_tool.execute(function, value)
+    assert result == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize(
+    "function,value,expected", [("log", math.e, 1.0), ("log10", 100, 2.0)]
+)
+def test_math_function_logarithmic(math_function_tool, function, value, expected):
+    """Test logarithmic functions."""
+    result = math_function_tool.execute(function, value)
+    assert result == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize(
+    "function,value,expected", [("floor", 3.7, 3), ("ceil", 3.2, 4)]
+)
+def test_math_function_floor_ceil(math_function_tool, function, value, expected):
+    """Test floor and ceil functions."""
+    assert math_function_tool.execute(function, value) == expected
+
+
+@pytest.mark.parametrize("value,expected", [(5, 120), (0, 1)])
+def test_math_function_factorial(math_function_tool, value, expected):
+    """Test factorial function."""
+    assert math_function_tool.execute("factorial", value) == expected
+
+
+def test_math_function_results_memoized(math_function_tool):
+    """Test repeated calls are served from the result cache."""
+    math_function_tool.execute("sqrt", 1234)
+    hits = MathFunctionTool._apply_cached.cache_info().hits
+    math_function_tool.execute("sqrt", 1234)
+    assert MathFunctionTool._apply_cached.cache_info().hits == hits + 1
+
+
+def test_math_function_memoized_per_function():
+    """Test a subclass with its own functions does not reuse cached results."""
+
+    class HalvingMath(MathFunctionTool):
+        _FUNCS = {**MathFunctionTool._FUNCS, "sqrt": lambda value: value / 2}
+
+    assert MathFunctionTool().execute("sqrt", 36.0) == 6.0
+    assert HalvingMath().execute("sqrt", 36.0) == 18.0
+
+
+def test_math_function_unknown_function(math_function_tool):
+    """Test that unknown functions raise ValueError."""
+    with pytest.raises(ValueError, match="Unknown function"):
+        math_function_tool.execute("unknown_func", 5)
+
+
+def test_math_function_invalid_input(math_function_tool):
+    """Test that invalid inputs raise ValueError."""
+    with pytest.raises(ValueError):
+        math_function_tool.execute("sqrt", -1)
+
+
+# MathFunctionBatchTool
+def test_math_function_batch_name(math_function_batch_tool):
+    """Test tool name."""
+    assert math_function_batch_tool.name == "math_function_batch"
+
+
+def test_math_function_batch_matches_scalar_execution(math_function_batch_tool):
+    """Test batch results match the scalar tool."""
+    scalar = MathFunctionTool()
+    values = [0.5, 1.0, 2.0, 10.0]
+    for function in ["sqrt", "sin", "log", "exp", "floor", "ceil", "radians"]:
+        expected = [scalar.execute(function, value) for value in values]
+        result = math_function_batch_tool.execute(function, values)
+        assert result == pytest.approx(expected)
+        assert [type(item) for item in result] == [type(item) for item in expected]
+
+
+@pytest.mark.parametrize(
+    "function,values", [("exp", [1000.0]), ("floor", [float("inf")])]
+)
+def test_math_function_batch_overflow(math_function_batch_tool, function, values):
+    """Test results the scalar tool rejects also raise in a batch."""
+    with pytest.raises(ValueError):
+        MathFunctionTool().execute(function, values[0])
+    with pytest.raises(ValueError):
+        math_function_batch_tool.execute(function, values)
+
+
+@pytest.mark.parametrize("function", ["floor", "ceil"])
+def test_math_function_batch_rounding_ints(math_function_batch_tool, function):
+    """Test floor and ceil return exact ints, even beyond the int64 range."""
+    values = [1e300, 2.5, -2.5]
+    expected = [getattr(math, function)(value) for value in values]
+    assert math_function_batch_tool.execute(function, values) == expected
+
+
+@pytest.mark.parametrize(
+    "function,values,expected",
+    [
+        ("floor", [2.5, 10**400], [2, 10**400]),
+        ("abs", [-3, -2.5], [3, 2.5]),
+    ],
+)
+def test_math_function_batch_scalar_fallback(
+    math_function_batch_tool, function, values, expected
+):
+    """Test values NumPy cannot represent exactly give the scalar results."""
+    result = math_function_batch_tool.execute(function, values)
+    assert result == expected
+    assert [type(item) for item in result] == [type(item) for item in expected]
+
+
+@pytest.mark.parametrize("values", [[None], [4, "9"], [10**400]])
+def test_math_function_batch_rejects_non_numbers(math_function_batch_tool, values):
+    """Test values the scalar tool rejects raise ValueError in a batch too."""
+    with pytest.raises(ValueError):
+        math_function_batch_tool.execute("sqrt", values)
+
+
+def test_import_does_not_load_numpy():
+    """Test NumPy is only imported when batch evaluation is used."""
+    code = "import sys, agentexp; assert 'numpy' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_math_function_batch_factorial(math_function_batch_tool):
+    """Test factorial falls back to the scalar implementation."""
+    assert math_function_batch_tool.execute("factorial", [0, 5]) == [1, 120]
+
+
+def test_math_function_execute_batch_returns_array(math_function_batch_tool):
+    """Test execute_batch returns a NumPy array."""
+    np = pytest.importorskip("numpy")
+    result = MathFunctionTool().execute_batch("sqrt", [4, 9])
+    assert isinstance(result, np.ndarray)
+    assert result.tolist() == [2.0, 3.0]
+
+
+def test_math_function_batch_unknown_function(math_function_batch_tool):
+    """Test that unknown functions raise ValueError."""
+    with pytest.raises(ValueError):
+        math_function_batch_tool.execute("unknown_func", [1, 2])
+
+
+def test_math_function_batch_invalid_input(math_function_batch_tool):
+    """Test that invalid inputs raise ValueError."""
+    with pytest.raises(ValueError):
+        math_function_batch_tool.execute("sqrt", [4, -1])
+
+
+# VerifyCalculationTool
+def test_verify_name(verify_calculation_tool):
+    """Test tool name."""
+    assert verify_calculation_tool.name == "verify_calculation"
+
+
+def test_verify_description(verify_calculation_tool):
+    """Test tool has a description."""
+    assert len(verify_calculation_tool.description) > 0
+
+
+@pytest.mark.parametrize(
+    "expression,expected", [("2 + 2", 4), ("5 * 3", 15), ("10 / 2", 5)]
+)
+def test_verify_correct_calculation(verify_calculation_tool, expression, expected):
+    """Test verification of correct calculations."""
+    assert verify_calculation_tool.execute(expression, expected)
+
+
+@pytest.mark.parametrize("expression,expected", [("2 + 2", 5), ("5 * 3", 14)])
+def test_verify_incorrect_calculation(verify_calculation_tool, expression, expected):
+    """Test verification of incorrect calculations."""
+    assert not verify_calculation_tool.execute(expression, expected)
+
+
+@pytest.mark.parametrize(
+    "expression,expected", [("1 / 3 * 3", 1.0), ("0.1 + 0.2", 0.3)]
+)
+def test_verify_floating_point(verify_calculation_tool, expression, expected):
+    """Test verification with floating point numbers."""
+    assert verify_calculation_tool.execute(expression, expected)
+
+
+def test_verify_large_floating_point(verify_calculation_tool):
+    """Test floating point tolerance scales with the magnitude."""
+    assert verify_calculation_tool.execute("0.1 * 3 * 1e20", 3e19)
+    assert not verify_calculation_tool.execute("1e20 + 1e12", 1e20)
+
+
+def test_verify_invalid_expression(verify_calculation_tool):
+    """Test that invalid expressions return False."""
+    assert not verify_calculation_tool.execute("invalid", 0)
+
+
+def test_verify_invalid_expression_cached(verify_calculation_tool):
+    """Test invalid expressions are rejected from the compile cache."""
+    assert not verify_calculation_tool.execute("2 +* 3", 5)
+    hits = _try_compile_expression.cache_info().hits
+    assert not verify_calculation_tool.execute("2 +* 3", 5)
+    assert _try_compile_expression.cache_info().hits == hits + 1
@@ -1,86 +1,478 @@
 """Tests for LLM providers."""
 
-import os
-from unittest.mock import Mock, patch
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
+import requests
 
+from agentexp.agent import Agent
 from agentexp.llm import OpenRouterProvider
 
+HELLO_MSGS = [{"role": "user", "content": "Hello"}]
+
+
+@pytest.fixture(scope="module")
+def make_response():
+    """Factory building mock chat completion responses."""
+
+    def _make_response(content="Response"):
+        body = {"choices": [{"message": {"content": content}}]}
+        return SimpleNamespace(
+            status_code=200, json=lambda: body, raise_for_status=lambda: None
+        )
+
+    return _make_response
+
+
+@pytest.fixture(scope="module")
+def make_stream_response():
+    """Factory building mock streamed (SSE) responses."""
+
+    def _make_stream_response(events, done=True):
+        lines = []
+        for event in events:
+            if isinstance(event, str):
+                event = {"choices": [{"delta": {"content": event}}]}
+            lines += [b"data: " + json.dumps(event).encode(), b""]
+        if done:
+            lines.append(b"data: [DONE]")
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = iter(lines)
+        return response
+
+    return _make_stream_response
+
+
+@pytest.fixture
+def error_response():
+    """A mock response whose status check fails."""
+    response = Mock(spec=requests.Response)
+    response.raise_for_status.side_effect = requests.HTTPError("HTTP Error")
+    return response
+
+
+@pytest.fixture
+def requests_post_mock(monkeypatch):
+    """Replace the HTTP POST of every requests session with a mock."""
+    mock = Mock()
+    monkeypatch.setattr("agentexp.llm.requests.Session.post", mock)
+    return mock
+
+
+@pytest.fixture(scope="session")
+def provider():
+    """A default provider shared by the tests that do not configure one."""
+    return OpenRouterProvider(api_key="test-key")
+
 
 class TestOpenRouterProvider:
     """Test the OpenRouterProvider class."""
 
-    def test_initialization_with_api_key(self):
+    def test_initialization_with_api_key(self, provider):
         """Test provider can be initialized with API key."""
-        provider = OpenRouterProvider(api_key="test-key")
         assert provider.api_key == "test-key"
         assert provider.model == "google/gemini-2.0-flash-exp:free"
 
-    def test_initialization_with_env_var(self):
+    def test_initialization_with_env_var(self, monkeypatch):
         """Test provider can be initialized from environment variable."""
-        with patch.dict(os.environ, {"OPENROUTER_API_KEY": "env-key"}):
-            provider = OpenRouterProvider()
-            assert provider.api_key == "env-key"
+        monkeypatch.setenv("OPENROUTER_API_KEY", "env-key")
+        provider = OpenRouterProvider()
+        assert provider.api_key == "env-key"
 
-    def test_initialization_without_api_key(self):
+    def test_initialization_without_api_key(self, monkeypatch):
         """Test provider raises error without API key."""
-        with patch.dict(os.environ, {}, clear=True):
-            with pytest.raises(ValueError) as exc_info:
-                OpenRouterProvider()
-            assert "API key" in str(exc_info.value)
+        monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+        with pytest.raises(ValueError, match="API key"):
+            OpenRouterProvider()
 
     def test_custom_model(self):
         """Test provider can be initialized with custom model."""
         provider = OpenRouterProvider(api_key="test-key", model="custom-model")
         assert provider.model == "custom-model"
 
-    @patch("agentexp.llm.requests.post")
-    def test_generate_success(self, mock_post):
+    def test_generate_success(self, provider, requests_post_mock, make_response):
         """Test successful generation."""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "choices": [{"message": {"content": "Generated response"}}]
-        }
-        mock_post.return_value = mock_response
+        requests_post_mock.return_value = make_response("Generated response")
 
-        provider = OpenRouterProvider(api_key="test-key")
-        messages = [{"role": "user", "content": "Hello"}]
-        result = provider.generate(messages)
+        result = provider.generate(HELLO_MSGS)
 
         assert result == "Generated response"
-        mock_post.assert_called_once()
-        call_args = mock_post.call_args
-        assert call_args[1]["json"]["model"] == "google/gemini-2.0-flash-exp:free"
-        assert call_args[1]["json"]["messages"] == messages
+        requests_post_mock.assert_called_once()
+        kwargs = requests_post_mock.call_args.kwargs
+        payload = json.loads(kwargs["data"])
+        assert payload["model"] == "google/gemini-2.0-flash-exp:free"
+        assert payload["messages"] == HELLO_MSGS
 
-    @patch("agentexp.llm.requests.post")
-    def test_generate_with_params(self, mock_post):
+    def test_generate_with_params(self, provider, requests_post_mock, make_response):
         """Test generation with custom parameters."""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "choices": [{"message": {"content": "Response"}}]
-        }
-        mock_post.return_value = mock_response
+        requests_post_mock.return_value = make_response()
 
-        provider = OpenRouterProvider(api_key="test-key")
-        messages = [{"role": "user", "content": "Hello"}]
-        provider.generate(messages, temperature=0.5, max_tokens=500)
+        provider.generate(HELLO_MSGS, temperature=0.5, max_tokens=500)
 
-        call_args = mock_post.call_args
-        assert call_args[1]["json"]["temperature"] == 0.5
-        assert call_args[1]["json"]["max_tokens"] == 500
+        kwargs = requests_post_mock.call_args.kwargs
+        payload = json.loads(kwargs["data"])
+        assert payload["temperature"] == 0.5
+        assert payload["max_tokens"] == 500
 
-    @patch("agentexp.llm.requests.post")
-    def test_generate_http_error(self, mock_post):
+    def test_generate_http_error(self, provider, requests_post_mock, error_response):
         """Test generation handles HTTP errors."""
-        mock_response = Mock()
-        mock_response.raise_for_status.side_effect = Exception("HTTP Error")
-        mock_post.return_value = mock_response
+        requests_post_mock.return_value = error_response
+
+        with pytest.raises(requests.HTTPError, match="HTTP Error"):
+            provider.generate(HELLO_MSGS)
+
+    def test_generate_cache_hit(self, requests_post_mock, make_response):
+        """Test deterministic requests are served from the cache."""
+        requests_post_mock.return_value = make_response("Cached response")
+
+        provider = OpenRouterProvider(api_key="test-key", cache_backend="memory")
+        assert provider.generate(HELLO_MSGS, temperature=0.0) == "Cached response"
+        assert provider.generate(HELLO_MSGS, temperature=0.0) == "Cached response"
+        requests_post_mock.assert_called_once()
+
+    def test_generate_cache_skipped_when_sampling(
+        self, requests_post_mock, make_response
+    ):
+        """Test non-zero temperature requests bypass the cache."""
+        requests_post_mock.return_value = make_response()
+
+        provider = OpenRouterProvider(api_key="test-key", cache_backend="memory")
+        provider.generate(HELLO_MSGS, temperature=0.7)
+        provider.generate(HELLO_MSGS, temperature=0.7)
+        assert requests_post_mock.call_count == 2
+
+    def test_default_temperature(self, requests_post_mock, make_response):
+        """Test requests without a temperature use the provider's default."""
+        requests_post_mock.return_value = make_response()
+        provider = OpenRouterProvider(api_key="test-key", temperature=0.2)
+
+        provider.generate(HELLO_MSGS)
+        payload = json.loads(requests_post_mock.call_args.kwargs["data"])
+        assert payload["temperature"] == 0.2
+        provider.generate(HELLO_MSGS, temperature=1.0)
+        payload = json.loads(requests_post_mock.call_args.kwargs["data"])
+        assert payload["temperature"] == 1.0
+
+    def test_agent_run_cached(self, requests_post_mock, make_response, calculator_tool):
+        """Test repeated agent runs are served from the cache at temperature 0."""
+        requests_post_mock.return_value = make_response('{"final_answer": "42"}')
+        provider = OpenRouterProvider(
+            api_key="test-key", cache_backend="memory", temperature=0.0
+        )
+        agent = Agent(provider, [calculator_tool])
+
+        assert agent.run("What is 6 * 7?") == "42"
+        assert agent.run("What is 6 * 7?") == "42"
+        requests_post_mock.assert_called_once()
+
+    def test_generate_semantic_cache_hit(self, requests_post_mock, make_response):
+        """Test paraphrased requests are served from the semantic cache."""
+        semantic_cache = pytest.importorskip("agentexp.semantic_cache")
+        pytest.importorskip("faiss")
+        embeddings = {"Hello": [1.0, 0.0], "Hi": [0.95, 0.05]}
+        requests_post_mock.return_value = make_response("Greetings")
 
         provider = OpenRouterProvider(api_key="test-key")
-        messages = [{"role": "user", "content": "Hello"}]
+        provider.semantic_cache = semantic_cache.SemanticCache(
+            embedder=embeddings.__getitem__
+        )
+        hi = [{"role": "user", "content": "Hi"}]
+        assert provider.generate(HELLO_MSGS, temperature=0.0) == "Greetings"
+        assert provider.generate(hi, temperature=0.0) == "Greetings"
+        requests_post_mock.assert_called_once()
+
+    def test_agent_run_semantic_cache_hit(
+        self, requests_post_mock, make_response, calculator_tool
+    ):
+        """Test a paraphrased agent task is served from the semantic cache."""
+        semantic_cache = pytest.importorskip("agentexp.semantic_cache")
+        pytest.importorskip("faiss")
+        embeddings = {"What is 6 * 7?": [1.0, 0.0], "Compute 6 * 7": [0.95, 0.05]}
+        requests_post_mock.return_value = make_response('{"final_answer": "42"}')
+
+        provider = OpenRouterProvider(api_key="test-key", temperature=0.0)
+        provider.semantic_cache = semantic_cache.SemanticCache(
+            embedder=embeddings.__getitem__
+        )
+        agent = Agent(provider, [calculator_tool])
+        assert agent.run("What is 6 * 7?") == "42"
+        assert agent.run("Compute 6 * 7") == "42"
+        requests_post_mock.assert_called_once()
+
+    def test_generate_semantic_cache_partitioned(
+        self, requests_post_mock, make_response
+    ):
+        """Test conversations ending with the same message do not collide."""
+        semantic_cache = pytest.importorskip("agentexp.semantic_cache")
+        pytest.importorskip("faiss")
+        requests_post_mock.side_effect = [make_response("4"), make_response("4 legs")]
+
+        provider = OpenRouterProvider(api_key="test-key")
+        provider.semantic_cache = semantic_cache.SemanticCache(
+            embedder=lambda text: [1.0, 0.0]
+        )
+        result = {"role": "user", "content": "Tool result: 4"}
+        sum_task = [{"role": "user", "content": "What is 2+2?"}, result]
+        dog_task = [{"role": "user", "content": "How many legs has a dog?"}, result]
+        assert provider.generate(sum_task, temperature=0.0) == "4"
+        assert provider.generate(dog_task, temperature=0.0) == "4 legs"
+        assert provider.generate(sum_task, temperature=0.0) == "4"
+        assert requests_post_mock.call_count == 2
+
+    def test_generate_semantic_cache_skipped_when_sampling(
+        self, requests_post_mock, make_response
+    ):
+        """Test non-zero temperature requests bypass the semantic cache."""
+        semantic_cache = pytest.importorskip("agentexp.semantic_cache")
+        pytest.importorskip("faiss")
+        requests_post_mock.return_value = make_response()
+
+        provider = OpenRouterProvider(api_key="test-key")
+        provider.semantic_cache = semantic_cache.SemanticCache(
+            embedder=lambda text: [1.0, 0.0]
+        )
+        provider.generate(HELLO_MSGS, temperature=0.7)
+        provider.generate(HELLO_MSGS, temperature=0.7)
+        assert requests_post_mock.call_count == 2
+        assert len(provider.semantic_cache) == 0
+
+    def test_agenerate_success(self, provider, make_response):
+        """Test successful asynchronous generation."""
+        pytest.importorskip("httpx")
+        mock_client = Mock()
+        mock_client.post = AsyncMock(return_value=make_response("Async response"))
+
+        with patch.object(provider, "_get_async_client", return_value=mock_client):
+            result = asyncio.run(provider.agenerate(HELLO_MSGS, temperature=0.5))
 
-        with pytest.raises(Exception) as exc_info:
-            provider.generate(messages)
-        assert "HTTP Error" in str(exc_info.value)
+        assert result == "Async response"
+        kwargs = mock_client.post.call_args.kwargs
+        payload = json.loads(kwargs["content"])
+        assert payload["messages"] == HELLO_MSGS
+        assert payload["temperature"] == 0.5
+
+    def test_async_client_reused_within_loop(self):
+        """Test the pooled client is shared within an event loop."""
+        pytest.importorskip("httpx")
+        provider = OpenRouterProvider(api_key="test-key")
+
+        async def get_clients():
+            clients = provider._get_async_client(), provider._get_async_client()
+            await provider.aclose()
+            return clients
+
+        first, second = asyncio.run(get_clients())
+        assert first is second
+
+    def test_close_closes_async_client(self):
+        """Test close() also closes the asynchronous client of a live loop."""
+        pytest.importorskip("httpx")
+        provider = OpenRouterProvider(api_key="test-key")
+
+        async def get_client():
+            return provider._get_async_client()
+
+        loop = asyncio.new_event_loop()
+        try:
+            client = loop.run_until_complete(get_client())
+            provider.close()
+            assert client.is_closed
+            assert provider._async_client is None
+        finally:
+            loop.close()
+
+    def test_generate_prompt_caching(self, requests_post_mock, make_response):
+        """Test system messages are marked cacheable when prompt caching is on."""
+        requests_post_mock.return_value = make_response()
+
+        provider = OpenRouterProvider(
+            api_key="test-key", model="anthropic/claude-3-haiku", prompt_caching=True
+        )
+        messages = [
+            {"role": "system", "content": "You are helpful."},
+            {"role": "user", "content": "Hello"},
+        ]
+        provider.generate(messages)
+
+        kwargs = requests_post_mock.call_args.kwargs
+        sent = json.loads(kwargs["data"])["messages"]
+        assert sent[0]["content"] == [
+            {
+                "type": "text",
+                "text": "You are helpful.",
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+        assert sent[1] == messages[1]
+        assert messages[0]["content"] == "You are helpful."
+        assert kwargs["headers"] == {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+    def test_prompt_caching_header_follows_model(
+        self, requests_post_mock, make_response
+    ):
+        """Test the prompt caching header is only sent to Anthropic models."""
+        requests_post_mock.return_value = make_response()
+        provider = OpenRouterProvider(api_key="test-key", prompt_caching=True)
+
+        provider.generate(HELLO_MSGS)
+        assert requests_post_mock.call_args.kwargs["headers"] == {}
+        provider.model = "anthropic/claude-3-haiku"
+        provider.generate(HELLO_MSGS)
+        assert "anthropic-beta" in requests_post_mock.call_args.kwargs["headers"]
+        provider.model = "openai/gpt-4o-mini"
+        provider.generate(HELLO_MSGS)
+        assert requests_post_mock.call_args.kwargs["headers"] == {}
+        assert "anthropic-beta" not in provider._session.headers
+
+    def test_generate_with_tools(self, requests_post_mock):
+        """Test native tool calling returns the assistant message."""
+        tool_calls = [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "calculator", "arguments": "{}"},
+            }
+        ]
+        body = {"choices": [{"message": {"content": None, "tool_calls": tool_calls}}]}
+        requests_post_mock.return_value = SimpleNamespace(
+            json=lambda: body, raise_for_status=lambda: None
+        )
+
+        provider = OpenRouterProvider(api_key="test-key", function_calling=True)
+        tools = [{"type": "function", "function": {"name": "calculator"}}]
+        message = provider.generate_with_tools(HELLO_MSGS, tools)
+
+        assert provider.supports_function_calling
+        assert message["tool_calls"] == tool_calls
+        kwargs = requests_post_mock.call_args.kwargs
+        payload = json.loads(kwargs["data"])
+        assert payload["tools"] == tools
+        assert payload["tool_choice"] == "auto"
+
+    def test_generate_early_exit_json(self, provider, requests_post_mock):
+        """Test streaming stops once the response holds a complete JSON object."""
+        chunks = ['{"final_', 'answer": "42"}', " Hope this", " helps!"]
+        lines = [b": OPENROUTER PROCESSING", b""]
+        for chunk in chunks:
+            delta = json.dumps({"choices": [{"delta": {"content": chunk}}]})
+            lines += [b"data: " + delta.encode(), b""]
+        lines.append(b"data: [DONE]")
+        consumed = []
+
+        def iter_lines():
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        mock_response = MagicMock()
+        mock_response.__enter__.return_value = mock_response
+        mock_response.iter_lines.side_effect = iter_lines
+        requests_post_mock.return_value = mock_response
+
+        result = provider.generate(HELLO_MSGS, early_exit_json=True)
+
+        assert result == '{"final_answer": "42"}'
+        assert consumed[-1].startswith(b"data: ")
+        assert len(consumed) == 5
+        kwargs = requests_post_mock.call_args.kwargs
+        assert json.loads(kwargs["data"])["stream"] is True
+        assert kwargs["stream"] is True
+        mock_response.__exit__.assert_called_once()
+
+    def test_early_exit_cached_separately(
+        self, requests_post_mock, make_response, make_stream_response
+    ):
+        """Test a truncated early-exit response is not replayed to full calls."""
+        requests_post_mock.side_effect = [
+            make_stream_response(['{"a": 1}', " and more"]),
+            make_response('{"a": 1} and more'),
+        ]
+        provider = OpenRouterProvider(api_key="test-key", cache_backend="memory")
+
+        early = provider.generate(HELLO_MSGS, temperature=0.0, early_exit_json=True)
+        assert early == '{"a": 1}'
+        full = provider.generate(HELLO_MSGS, temperature=0.0)
+        assert full == '{"a": 1} and more'
+        assert provider.generate(HELLO_MSGS, temperature=0.0, early_exit_json=True) == (
+            '{"a": 1}'
+        )
+        assert requests_post_mock.call_count == 2
+
+    def test_early_exit_interrupted_stream_not_cached(
+        self, requests_post_mock, make_stream_response
+    ):
+        """Test a stream ending without [DONE] or a JSON object is not cached."""
+        requests_post_mock.side_effect = [
+            make_stream_response(['{"final_answer": '], done=False),
+            make_stream_response(['{"final_answer": "42"}']),
+        ]
+        provider = OpenRouterProvider(api_key="test-key", cache_backend="memory")
+
+        partial = provider.generate(HELLO_MSGS, temperature=0.0, early_exit_json=True)
+        assert partial == '{"final_answer": '
+        result = provider.generate(HELLO_MSGS, temperature=0.0, early_exit_json=True)
+        assert result == '{"final_answer": "42"}'
+        assert requests_post_mock.call_count == 2
+
+    def test_early_exit_stream_error(
+        self, provider, requests_post_mock, make_stream_response
+    ):
+        """Test an error event in the stream raises instead of being returned."""
+        requests_post_mock.return_value = make_stream_response(
+            ["{", {"error": {"message": "Provider overloaded"}}], done=False
+        )
+        with pytest.raises(requests.HTTPError, match="Provider overloaded"):
+            provider.generate(HELLO_MSGS, early_exit_json=True)
+
+    def test_model_switch_after_init(self, requests_post_mock, make_response):
+        """Test changing the model attribute changes the requested model."""
+        requests_post_mock.return_value = make_response("Hi")
+        provider = OpenRouterProvider(api_key="test-key", model="first/model")
+        provider.model = "second/model"
+
+        provider.generate(HELLO_MSGS)
+        payload = json.loads(requests_post_mock.call_args.kwargs["data"])
+        assert payload["model"] == "second/model"
+
+    def test_session_reused(self, requests_post_mock, make_response):
+        """Test requests share a session carrying the authentication headers."""
+        requests_post_mock.return_value = make_response()
+
+        with OpenRouterProvider(api_key="test-key") as provider:
+            provider.generate(HELLO_MSGS)
+            provider.generate(HELLO_MSGS)
+
+        assert requests_post_mock.call_count == 2
+        assert provider._session.headers["Authorization"] == "Bearer test-key"
+
+    def test_agenerate_retries_rate_limited(self, provider, make_response):
+        """Test asynchronous generation retries 429 responses."""
+        pytest.importorskip("httpx")
+        rate_limited = SimpleNamespace(status_code=429, headers={"Retry-After": "0"})
+        success = make_response("Done")
+        mock_client = Mock()
+        mock_client.post = AsyncMock(side_effect=[rate_limited, success])
+
+        with patch.object(provider, "_get_async_client", return_value=mock_client):
+            result = asyncio.run(provider.agenerate(HELLO_MSGS))
+
+        assert result == "Done"
+        assert mock_client.post.call_count == 2
+
+    def test_session_retries_configured(self):
+        """Test the session retries rate-limited and failed requests."""
+        provider = OpenRouterProvider(api_key="test-key", max_retries=5)
+        retry = provider._session.get_adapter(provider.base_url).max_retries
+        assert retry.total == 5
+        assert retry.connect == retry.status == 5
+        assert 429 in retry.status_forcelist
+
+    def test_session_read_timeouts_not_retried(self):
+        """Test read timeouts are not retried, as the request may be processed."""
+        provider = OpenRouterProvider(api_key="test-key")
+        retry = provider._session.get_adapter(provider.base_url).max_retries
+        assert retry.read == 0
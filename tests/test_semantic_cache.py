@@ -0,0 +1,49 @@
+"""Tests for the semantic response cache."""
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from agentexp.semantic_cache import SemanticCache  # noqa: E402
+
+# Toy embeddings: the two arithmetic phrasings point in nearly the same direction
+EMBEDDINGS = {
+    "What is 15*23+47?": [1.0, 0.0, 0.0],
+    "Compute 15 times 23 plus 47": [0.99, 0.1, 0.0],
+    "What is the capital of France?": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(threshold=0.9, embedder=EMBEDDINGS.__getitem__)
+
+
+class TestSemanticCache:
+    """Test the SemanticCache class."""
+
+    def test_empty_lookup(self, cache):
+        """Test lookups on an empty cache miss."""
+        assert cache.lookup("What is 15*23+47?") is None
+
+    def test_exact_hit(self, cache):
+        """Test the same text hits the cache."""
+        cache.add("What is 15*23+47?", "392")
+        assert cache.lookup("What is 15*23+47?") == "392"
+        assert len(cache) == 1
+
+    def test_paraphrase_hit(self, cache):
+        """Test a paraphrased text hits the cache."""
+        cache.add("What is 15*23+47?", "392")
+        assert cache.lookup("Compute 15 times 23 plus 47") == "392"
+
+    def test_unrelated_miss(self, cache):
+        """Test an unrelated text misses the cache."""
+        cache.add("What is 15*23+47?", "392")
+        assert cache.lookup("What is the capital of France?") is None
+
+    def test_partitions_isolated(self, cache):
+        """Test lookups only consider entries of their own partition."""
+        cache.add("What is 15*23+47?", "392", partition="a")
+        assert cache.lookup("What is 15*23+47?", partition="b") is None
+        assert cache.lookup("What is 15*23+47?", partition="a") == "392"
@@ -1,10 +1,63 @@
 """Tests for tool base class."""
 
+from typing import Optional
+
 import pytest
 
 from agentexp.tools import Tool
 
 
+class ConcreteTool(Tool):
+    @property
+    def name(self):
+        return "test_tool"
+
+    @property
+    def description(self):
+        return "A test tool"
+
+    def execute(self, **kwargs):
+        return "executed"
+
+
+class SimpleTool(Tool):
+    @property
+    def name(self):
+        return "simple"
+
+    @property
+    def description(self):
+        return "Simple tool"
+
+    def execute(self, **kwargs):
+        pass
+
+
+class TypedTool(Tool):
+    @property
+    def name(self):
+        return "typed"
+
+    @property
+    def description(self):
+        return "Typed tool"
+
+    def execute(
+        self,
+        text: str,
+        count: int,
+        scale: float = 1.0,
+        values: Optional[list[float]] = None,
+    ):
+        pass
+
+
+@pytest.fixture(scope="session")
+def concrete_tool():
+    """A ConcreteTool shared by the whole test session."""
+    return ConcreteTool()
+
+
 class TestTool:
     """Test the Tool base class."""
 
@@ -13,41 +66,29 @@ class TestTool:
         with pytest.raises(TypeError):
             Tool()
 
-    def test_concrete_tool_implementation(self):
+    def test_concrete_tool_implementation(self, concrete_tool):
         """Test that a concrete tool can be implemented."""
-
-        class ConcreteTool(Tool):
-            @property
-            def name(self):
-                return "test_tool"
-
-            @property
-            def description(self):
-                return "A test tool"
-
-            def execute(self, **kwargs):
-                return "executed"
-
-        tool = ConcreteTool()
-        assert tool.name == "test_tool"
-        assert tool.description == "A test tool"
-        assert tool.execute() == "executed"
+        assert concrete_tool.name == "test_tool"
+        assert concrete_tool.description == "A test tool"
+        assert concrete_tool.execute() == "executed"
 
     def test_tool_repr(self):
         """Test tool string representation."""
-
-        class SimpleTool(Tool):
-            @property
-            def name(self):
-                return "simple"
-
-            @property
-            def description(self):
-                return "Simple tool"
-
-            def execute(self, **kwargs):
-                pass
-
         tool = SimpleTool()
         assert "SimpleTool" in repr(tool)
         assert "simple" in repr(tool)
+
+    def test_tool_parameters_schema(self):
+        """Test the argument schema is inferred from the execute signature."""
+        schema = TypedTool().to_function_schema()
+        assert schema["function"]["name"] == "typed"
+        assert schema["function"]["parameters"] == {
+            "type": "object",
+            "properties": {
+                "text": {"type": "string"},
+                "count": {"type": "integer"},
+                "scale": {"type": "number"},
+                "values": {"type": "array", "items": {"type": "number"}},
+            },
+            "required": ["text", "count"],
+        }